@@ -0,0 +1,125 @@
+import time
+import sqlite3
+
+import numpy as np
+
+#==============================================================================
+# Asynchronous successive halving (ASHA) for early stopping in sweeps.
+#==============================================================================
+
+CONTINUE = "continue"
+STOP = "stop"
+
+class ASHA:
+    """
+    Early stopping scheduler shared by all runs of a sweep through a sqlite
+    file, so runs on one node or on a shared filesystem coordinate without
+    a server (the filesystem has to support file locks, which NFS mounted
+    with nolock does not).
+
+    Rungs are at min_resource * reduction_factor**k (e.g. timesteps 1e4, 3e4,
+    9e4, ... up to max_resource). The first time a run reports at or past a
+    rung its metric is recorded there, and the run continues only if the
+    metric is in the top 1/reduction_factor of everything recorded at that
+    rung so far. Runs are never paused, so early runs are judged against
+    fewer results (and are more likely to continue), as in the stopping
+    variant of ASHA.
+
+        scheduler = ASHA("asha.sqlite", min_resource=1e4, max_resource=1e6)
+        for step in range(timesteps):
+            ...
+            if scheduler.report(trial, step, reward) == STOP:
+                break
+    """
+    def __init__(self, path, min_resource=1, max_resource=None, reduction_factor=3,
+                 mode="max", experiment="default"):
+        if mode not in ["max", "min"]:
+            raise ValueError("mode must be 'max' or 'min'")
+        self.path = path
+        self.mode = mode
+        self.experiment = experiment
+        self.reduction_factor = reduction_factor
+        # Last decision of every trial reported from this process.
+        self.decisions = {}
+        self.rungs = [min_resource]
+        # Without a budget keep adding rungs; 64 is plenty for any factor > 1.
+        while len(self.rungs) < 64 and (max_resource is None or
+                self.rungs[-1]*reduction_factor < max_resource):
+            self.rungs.append(self.rungs[-1]*reduction_factor)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rungs ("
+                          "experiment TEXT, trial TEXT, rung INTEGER, "
+                          "resource REAL, metric REAL, decision TEXT, time REAL, "
+                          "PRIMARY KEY (experiment, trial, rung))")
+
+    def close(self):
+        self.conn.close()
+
+    def rung_of(self, resource):
+        """Index of the highest rung resource has reached, -1 if none."""
+        return int(np.searchsorted(self.rungs, resource, side='right')) - 1
+
+    def cutoff(self, metrics):
+        """Worst metric that still continues among metrics recorded at a rung."""
+        q = 100*(1 - 1/self.reduction_factor)
+        if self.mode == "max":
+            return np.nanpercentile(metrics, q)
+        return np.nanpercentile(metrics, 100 - q)
+
+    def report(self, trial, resource, metric):
+        """
+        Report the metric of trial after resource (e.g. steps) and return
+        CONTINUE or STOP. Cheap between rungs: only crossing a rung touches
+        the database.
+        """
+        rung = self.rung_of(resource)
+        if rung < 0:
+            return CONTINUE
+        if trial in self.decisions:
+            last_rung, decision = self.decisions[trial]
+            if last_rung >= rung or decision == STOP:
+                return decision
+        # BEGIN IMMEDIATE takes the write lock up front, so two runs crossing
+        # the same rung are judged one after the other.
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT MAX(rung), decision FROM rungs WHERE "
+                                    "experiment = ? AND trial = ?",
+                                    (self.experiment, trial)).fetchone()
+            if row[0] is not None and (row[0] >= rung or row[1] == STOP):
+                self.conn.execute("COMMIT")
+                self.decisions[trial] = row
+                return row[1]
+            metrics = [m for (m,) in self.conn.execute(
+                "SELECT metric FROM rungs WHERE experiment = ? AND rung = ?",
+                (self.experiment, rung))] + [metric]
+            cutoff = self.cutoff(np.array(metrics, dtype=np.float64))
+            better = metric >= cutoff if self.mode == "max" else metric <= cutoff
+            decision = CONTINUE if better else STOP
+            self.conn.execute("INSERT INTO rungs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (self.experiment, trial, rung, resource, metric,
+                               decision, time.time()))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.decisions[trial] = (rung, decision)
+        return decision
+
+    def stopped(self, trial):
+        """Whether trial has been told to stop."""
+        row = self.conn.execute("SELECT 1 FROM rungs WHERE experiment = ? AND "
+                                "trial = ? AND decision = ?",
+                                (self.experiment, trial, STOP)).fetchone()
+        return row is not None
+
+    def rung_results(self):
+        """{rung index: (trials, metrics)} recorded so far."""
+        results = {}
+        for rung, trial, metric in self.conn.execute(
+                "SELECT rung, trial, metric FROM rungs WHERE experiment = ? "
+                "ORDER BY rung, time", (self.experiment,)):
+            trials, metrics = results.setdefault(rung, ([], []))
+            trials.append(trial)
+            metrics.append(metric)
+        return results
@@ -0,0 +1,69 @@
+import time
+import uuid
+import threading
+import concurrent.futures
+
+#==============================================================================
+# wandb.init in a background thread.
+#==============================================================================
+
+class AsyncRun:
+    """
+    Handle of a run whose wandb.init is still in progress. The handshake
+    (and the wandb import) happen in a background thread so that building
+    environments, models etc. overlaps with it.
+
+    log, finish and summary wait for the run to be ready, so the handle can
+    be used wherever the run would be (e.g. by BatchedLogger, whose thread is
+    the only one that waits). result() returns the wandb run itself.
+
+    on_ready(run) is called in the background thread once the run exists.
+    """
+    def __init__(self, init_kwargs, on_ready=None):
+        self.init_kwargs = init_kwargs
+        self.on_ready = on_ready
+        self.init_seconds = None
+        self.future = concurrent.futures.Future()
+        self.thread = threading.Thread(target=self._init, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def new_id():
+        """A run id in the same format wandb uses."""
+        return uuid.uuid4().hex[:8]
+
+    def _init(self):
+        start = time.perf_counter()
+        try:
+            import wandb
+            run = wandb.init(**self.init_kwargs)
+            self.init_seconds = time.perf_counter() - start
+            if self.on_ready is not None:
+                self.on_ready(run)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(run)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def add_done_callback(self, fn):
+        self.future.add_done_callback(fn)
+
+    def log(self, *args, **kwargs):
+        return self.result().log(*args, **kwargs)
+
+    @property
+    def summary(self):
+        return self.result().summary
+
+    @property
+    def dir(self):
+        return self.result().dir
+
+    def finish(self, *args, **kwargs):
+        return self.result().finish(*args, **kwargs)
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import utils
+from asha import ASHA, STOP
+
+#==============================================================================
+# Simulated sweep with asha.ASHA: compute spent and whether the best configs
+# survive, with several processes sharing the scheduler's sqlite file.
+#==============================================================================
+
+def curve(quality, step, max_steps, rng):
+    """Noisy learning curve that rises towards quality."""
+    return quality*(1 - np.exp(-5*step/max_steps)) + 0.05*rng.standard_normal()
+
+def run_trial(job):
+    path, trial, quality, args = job
+    scheduler = ASHA(path, args.min_resource, args.max_steps, args.reduction_factor)
+    rng = np.random.default_rng(trial)
+    steps = args.max_steps
+    for step in range(args.report_every, args.max_steps + 1, args.report_every):
+        if scheduler.report(str(trial), step, curve(quality, step, args.max_steps, rng)) == STOP:
+            steps = step
+            break
+    scheduler.close()
+    return trial, steps
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_trials", "-nt", type=int, default=200)
+    parser.add_argument("--max_steps", "-ms", type=int, default=100000)
+    parser.add_argument("--min_resource", "-mr", type=int, default=2000)
+    parser.add_argument("--reduction_factor", "-rf", type=float, default=3.)
+    parser.add_argument("--report_every", "-re", type=int, default=500)
+    parser.add_argument("--num_workers", "-nw", type=int, default=8)
+    parser.add_argument("--top", type=int, default=5,
+        help="Check how many of the top configs ran to the end.")
+    args = parser.parse_args(raw_args)
+
+    path = os.path.join(tempfile.mkdtemp(), "asha.sqlite")
+    qualities = np.random.default_rng(0).uniform(0, 1, args.num_trials)
+    jobs = [(path, i, q, args) for i, q in enumerate(qualities)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.num_workers) as pool:
+        steps = dict(pool.imap_unordered(run_trial, jobs))
+    seconds = time.perf_counter() - start
+
+    total = sum(steps.values())
+    full = args.num_trials * args.max_steps
+    best = np.argsort(-qualities)[:args.top]
+    finished = sum(steps[i] == args.max_steps for i in best)
+    print("%d trials in %.2f s, %.1f%% of the full sweep's steps (%.1fx less)"
+          % (args.num_trials, seconds, 100*total/full, full/total))
+    print(utils.colorize("%d of the top %d configs ran to the end" % (finished, args.top),
+          color="green" if finished == args.top else "yellow", bold=True))
+    return total/full
+
+if __name__ == '__main__':
+    main()
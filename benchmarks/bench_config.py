@@ -0,0 +1,52 @@
+import os
+import sys
+import timeit
+import argparse
+import collections
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+
+#==============================================================================
+# Cost of reading a hyperparameter from the different config objects main()
+# can hand to training code.
+#==============================================================================
+
+def make_configs():
+    os.environ.setdefault("WANDB_SILENT", "true")
+    import wandb
+    import wandb_setup
+    config = vars(wandb_setup.get_parser().parse_args([]))
+    config["save_dir"] = "/tmp"
+
+    wandb_config = wandb.Config()
+    wandb_config.update(config)
+    Config = collections.namedtuple("Config", sorted(config))
+    return {
+        "dict[key]": (config, "c['float_arg']"),
+        "wandb.config": (wandb_config, "c.float_arg"),
+        "ConfigDict": (utils.ConfigDict(config), "c.float_arg"),
+        "namedtuple": (Config(**config), "c.float_arg"),
+        "freeze_config": (utils.freeze_config(config), "c.float_arg"),
+    }
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", "-n", type=int, default=1000000)
+    parser.add_argument("--repeats", "-r", type=int, default=5)
+    args = parser.parse_args(raw_args)
+
+    results = {}
+    for case, (c, stmt) in make_configs().items():
+        seconds = min(timeit.repeat(stmt, globals={"c": c}, number=args.number,
+                                    repeat=args.repeats))
+        results[case] = 1e9*seconds/args.number
+    baseline = results["wandb.config"]
+    for case, ns in results.items():
+        print("%-15s %8.1f ns/access  %6.1fx" % (case, ns, baseline/ns))
+    return results
+
+if __name__ == '__main__':
+    main()
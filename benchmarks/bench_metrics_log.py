@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import metrics_log
+
+#==============================================================================
+# Writing metrics_log.MetricsLog and loading many runs back, against a json
+# lines history file as the baseline.
+#==============================================================================
+
+def write_runs(root, num_runs, num_rows, num_metrics):
+    rng = np.random.default_rng(0)
+    names = ["metric_%d" % i for i in range(num_metrics)]
+    directories, append_seconds = [], 0.
+    for r in range(num_runs):
+        directory = os.path.join(root, "run_%05d" % r)
+        values = rng.standard_normal((num_rows, num_metrics))
+        log = metrics_log.MetricsLog(os.path.join(directory, "metrics"))
+        start = time.perf_counter()
+        for step in range(num_rows):
+            log.append(dict(zip(names, values[step].tolist())), step)
+        append_seconds += time.perf_counter() - start
+        log.close()
+        with open(os.path.join(directory, "history.jsonl"), 'w') as f:
+            for step in range(num_rows):
+                row = dict(zip(names, values[step].tolist()), step=step)
+                f.write(json.dumps(row) + '\n')
+        directories.append(directory)
+    return directories, names, append_seconds
+
+def load_jsonl(directories, keys):
+    curves = []
+    for directory in directories:
+        with open(os.path.join(directory, "history.jsonl")) as f:
+            rows = [json.loads(line) for line in f]
+        curves.append(np.array([[row[k] for k in keys] for row in rows]))
+    return curves
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_runs", "-nr", type=int, default=1000)
+    parser.add_argument("--num_rows", "-nro", type=int, default=1000)
+    parser.add_argument("--num_metrics", "-nm", type=int, default=20)
+    parser.add_argument("--keys", "-k", type=int, default=2,
+        help="Number of metrics loaded back.")
+    args = parser.parse_args(raw_args)
+
+    root = tempfile.mkdtemp()
+    directories, names, append_seconds = write_runs(root, args.num_runs, args.num_rows,
+                                                    args.num_metrics)
+    keys = names[:args.keys]
+
+    start = time.perf_counter()
+    stacked = metrics_log.load_many(directories, keys)
+    mmap_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    load_jsonl(directories, keys)
+    jsonl_seconds = time.perf_counter() - start
+
+    assert stacked[keys[0]].shape == (args.num_runs, args.num_rows)
+    print("append            %8.2f us/row" % (1e6*append_seconds/(args.num_runs*args.num_rows)))
+    print("load_many         %8.3f s for %d runs" % (mmap_seconds, args.num_runs))
+    print("json lines        %8.3f s (%.1fx slower)" % (jsonl_seconds, jsonl_seconds/mmap_seconds))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+
+#==============================================================================
+# Benchmarks for the config -> name -> init pipeline on synthetic parsers.
+# Everything runs locally; main() is run with wandb disabled.
+#==============================================================================
+
+def make_parser(num_args, seed=0):
+    """
+    A parser shaped like the one in wandb_setup: the keys get_name relies on
+    plus num_args arguments of mixed type, half of them with a short name.
+    """
+    rng = random.Random(seed)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config_file", "-cf", type=str, default=None)
+    parser.add_argument("--seed", "-s", type=int, default=None)
+    parser.add_argument("--project", "-p", type=str, default="ABC")
+    parser.add_argument("--group", "-g", type=str, default=None)
+    parser.add_argument("--name", "-n", type=str, default=None)
+    for i in range(num_args):
+        names = ["--arg_%d" % i] + (["-a%d" % i] if i % 2 == 0 else [])
+        kind = i % 5
+        if kind == 0:
+            parser.add_argument(*names, type=int, default=rng.randint(0, 100))
+        elif kind == 1:
+            parser.add_argument(*names, type=float, default=rng.random())
+        elif kind == 2:
+            parser.add_argument(*names, type=str, default="value_%d" % i)
+        elif kind == 3:
+            parser.add_argument(*names, action="store_true")
+        else:
+            parser.add_argument(*names, type=int, nargs='*', default=[1, 2])
+    return parser
+
+def make_sweep(parser, sweep_size, changed=5, seed=0):
+    """raw_args vectors that each change a few randomly chosen arguments."""
+    rng = random.Random(seed)
+    actions = [a for a in parser._actions if a.dest.startswith("arg_")]
+    sweep = []
+    for _ in range(sweep_size):
+        raw_args = []
+        for action in rng.sample(actions, min(changed, len(actions))):
+            option = action.option_strings[-1]
+            if action.nargs == 0:
+                raw_args += [option]
+            elif action.nargs == '*':
+                raw_args += [option, str(rng.randint(0, 9)), str(rng.randint(0, 9))]
+            elif action.type is float:
+                raw_args += [option, str(rng.random())]
+            elif action.type is int:
+                raw_args += [option, str(rng.randint(0, 1000))]
+            else:
+                raw_args += [option, "v%d" % rng.randint(0, 1000)]
+        sweep.append(raw_args)
+    return sweep
+
+def timeit(fn, min_time=0.2):
+    """Best of repeated runs of fn, repeating until min_time has passed."""
+    best, total = float('inf'), 0.
+    while total < min_time or best == float('inf'):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best, total = min(best, elapsed), total + elapsed
+    return best
+
+def bench_parser_functions(num_args, sweep_size, min_time):
+    parser = make_parser(num_args)
+    sweep = make_sweep(parser, sweep_size)
+    parsed = [vars(parser.parse_args(raw_args)) for raw_args in sweep]
+    default_config = {"arg_0": -1}
+
+    def merge():
+        return [utils.merge_configs(default_config, parser, args, raw_args)
+                for args, raw_args in zip(parsed, sweep)]
+    configs = merge()
+    for i, config in enumerate(configs):
+        config["seed"] = i
+
+    def name_loop():
+        for config in configs:
+            utils.get_name(parser, default_config, config, '')
+
+    def concat_loop():
+        for config in configs:
+            utils.concat_nondefault_arguments(parser, default_config=default_config,
+                                              actual_config=config)
+
+    cases = {
+        "get_sl_map": (lambda: utils.get_sl_map(parser), 1),
+        "parse_args": (lambda: [parser.parse_args(r) for r in sweep], sweep_size),
+        "merge_configs": (merge, sweep_size),
+        "get_name": (name_loop, sweep_size),
+        "get_names": (lambda: utils.get_names(parser, default_config, configs, ''),
+                      sweep_size),
+        "concat_nondefault_arguments": (concat_loop, sweep_size),
+    }
+    results = []
+    for case, (fn, items) in cases.items():
+        seconds = timeit(fn, min_time)
+        results.append(dict(case=case, num_args=num_args, sweep_size=sweep_size,
+                            seconds=seconds, us_per_item=1e6*seconds/items))
+    return results
+
+def bench_files(num_args, min_time):
+    parser = make_parser(num_args)
+    config = vars(parser.parse_args([]))
+    tmp_dir = tempfile.mkdtemp()
+    cases = {
+        "save_json": lambda: utils.save_dict_as_json(config, tmp_dir, "config"),
+        "load_json": lambda: utils.load_dict_from_json(tmp_dir, "config"),
+        "save_pkl": lambda: utils.save_dict_as_pkl(config, tmp_dir, "config"),
+        "load_pkl": lambda: utils.load_dict_from_pkl(tmp_dir, "config"),
+    }
+    results = []
+    for case, fn in cases.items():
+        seconds = timeit(fn, min_time)
+        results.append(dict(case=case, num_args=num_args, sweep_size=1,
+                            seconds=seconds, us_per_item=1e6*seconds))
+    return results
+
+def bench_main(repeats):
+    """Full wandb_setup.main() with wandb disabled, run in a scratch dir."""
+    os.environ["WANDB_MODE"] = "disabled"
+    os.environ["WANDB_SILENT"] = "true"
+    import wandb_setup
+
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        results = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            _, timings = wandb_setup.main(["-ia", str(i)], return_timings=True)
+            seconds = time.perf_counter() - start
+            results.append(dict(case="main", num_args=len(wandb_setup.get_parser()._actions),
+                                sweep_size=1, seconds=seconds, us_per_item=1e6*seconds,
+                                repeat=i, phases=timings["phases"]))
+    finally:
+        os.chdir(cwd)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_args", "-na", type=int, nargs='*', default=[10, 100, 1000])
+    parser.add_argument("--sweep_sizes", "-ss", type=int, nargs='*', default=[1, 100, 10000])
+    parser.add_argument("--max_work", "-mw", type=float, default=1e6,
+        help="Skip combinations with num_args * sweep_size above this.")
+    parser.add_argument("--main_repeats", "-mr", type=int, default=3,
+        help="Number of full main() runs. 0 skips them.")
+    parser.add_argument("--min_time", "-mt", type=float, default=0.2,
+        help="Repeat every case for at least this many seconds.")
+    parser.add_argument("--full", action="store_true",
+        help="Add sweeps of 100k configs and lift the max_work limit.")
+    parser.add_argument("--output", "-o", type=str, default="bench_results.json")
+    args = parser.parse_args(raw_args)
+
+    if args.full:
+        args.sweep_sizes = sorted(set(args.sweep_sizes + [100000]))
+        args.max_work = float('inf')
+
+    results = []
+    for num_args in args.num_args:
+        results += bench_files(num_args, args.min_time)
+        for sweep_size in args.sweep_sizes:
+            if num_args * sweep_size > args.max_work:
+                continue
+            results += bench_parser_functions(num_args, sweep_size, args.min_time)
+    if args.main_repeats > 0:
+        results += bench_main(args.main_repeats)
+
+    for r in results:
+        print("%-28s args %5d  sweep %6d  %12.2f us/item"
+              % (r["case"], r["num_args"], r["sweep_size"], r["us_per_item"]))
+
+    report = dict(commit=git_commit(), python=platform.python_version(),
+                  platform=platform.platform(), time=time.time(), results=results)
+    utils.save_dict_as_json(report, args.output)
+    print(utils.colorize("Results written to %s" % args.output, color="green", bold=True))
+    return report
+
+if __name__ == '__main__':
+    main()
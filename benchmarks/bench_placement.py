@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+import placement
+
+#==============================================================================
+# Aggregate throughput of several BLAS heavy processes on one node, pinned
+# with placement.py versus left to the OS with default thread counts.
+#==============================================================================
+
+def worker(cpus, size, seconds, results):
+    # Spawned fresh, so numpy is imported only after the placement is applied.
+    if cpus is not None:
+        placement.apply(cpus)
+    import numpy as np
+    a = np.random.default_rng(0).standard_normal((size, size))
+    a @ a
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        a @ a
+        count += 1
+    results.put(count / (time.perf_counter() - start))
+
+def measure(num_runs, cores_per_run, size, seconds):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    if cores_per_run is None:
+        slots = [None]*num_runs
+    else:
+        slots = [cpus for _, cpus in placement.plan(num_runs, cores_per_run)]
+    processes = [context.Process(target=worker, args=(cpus, size, seconds, results))
+                 for cpus in slots]
+    for p in processes:
+        p.start()
+    rates = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return sum(rates)
+
+def main(raw_args=None):
+    num_cpus = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_runs", "-nr", type=int, default=None,
+        help="Concurrent runs. Defaults to cores / cores_per_run.")
+    parser.add_argument("--cores_per_run", "-cpr", type=int, default=max(1, num_cpus // 4))
+    parser.add_argument("--size", "-s", type=int, default=512)
+    parser.add_argument("--seconds", "-t", type=float, default=5.)
+    args = parser.parse_args(raw_args)
+    num_runs = args.num_runs or max(1, num_cpus // args.cores_per_run)
+
+    print("%d runs on %d cores (numa nodes: %s)"
+          % (num_runs, num_cpus, ", ".join(map(str, placement.numa_nodes()))))
+    unpinned = measure(num_runs, None, args.size, args.seconds)
+    pinned = measure(num_runs, args.cores_per_run, args.size, args.seconds)
+    print("unpinned          %8.1f matmuls/s" % unpinned)
+    print(utils.colorize("pinned (%d cores) %8.1f matmuls/s  %.2fx"
+          % (args.cores_per_run, pinned, pinned/unpinned), color="green", bold=True))
+    return unpinned, pinned
+
+if __name__ == '__main__':
+    main()
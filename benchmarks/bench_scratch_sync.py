@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+import scratch_sync
+from scratch_sync import ScratchSyncer
+
+#==============================================================================
+# scratch_sync between two local directories: full and incremental passes,
+# and recovery of a run whose job died before its final sync. Point
+# --scratch_root and --durable_root at e.g. $TMPDIR and the networked
+# filesystem to measure the real thing.
+#==============================================================================
+
+def write_files(directory, first, count, size):
+    os.makedirs(os.path.join(directory, "files"), exist_ok=True)
+    for i in range(first, first + count):
+        with open(os.path.join(directory, "files", "file_%05d.bin" % i), 'wb') as f:
+            f.write(os.urandom(size))
+
+def mismatches(scratch_dir, durable_dir):
+    """Files under scratch_dir missing from durable_dir or different there."""
+    bad = []
+    for dirpath, _, filenames in os.walk(scratch_dir):
+        for filename in filenames:
+            if filename.startswith(".sync"):
+                continue
+            path = os.path.join(dirpath, filename)
+            copy = os.path.join(durable_dir, os.path.relpath(path, scratch_dir))
+            if not os.path.exists(copy):
+                bad.append(path)
+                continue
+            with open(path, 'rb') as a, open(copy, 'rb') as b:
+                if a.read() != b.read():
+                    bad.append(path)
+    return bad
+
+def crashed_job(scratch_dir, durable_dir, num_files, size):
+    # Syncs part of the run, keeps writing and dies without run.finish().
+    syncer = ScratchSyncer(scratch_dir, durable_dir, start=False)
+    write_files(scratch_dir, 0, num_files, size)
+    syncer.sync_once()
+    write_files(scratch_dir, num_files, num_files, size)
+    os._exit(1)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_files", "-nf", type=int, default=1000)
+    parser.add_argument("--size", "-s", type=int, default=64*1024,
+        help="Bytes per file.")
+    parser.add_argument("--changed", "-c", type=float, default=0.1,
+        help="Fraction of files rewritten before the incremental pass.")
+    parser.add_argument("--scratch_root", "-sr", type=str, default=None)
+    parser.add_argument("--durable_root", "-dr", type=str, default=None)
+    args = parser.parse_args(raw_args)
+    scratch_root = tempfile.mkdtemp(dir=args.scratch_root)
+    base_dir = tempfile.mkdtemp(dir=args.durable_root)
+    mirror = scratch_sync.scratch_path(scratch_root, base_dir)
+
+    # A finished run: one full pass, one pass without changes, one after
+    # rewriting some of the files.
+    run_dir = os.path.join(mirror, "wandb", "run-finished")
+    durable_dir = scratch_sync.durable_path(scratch_root, base_dir, run_dir)
+    write_files(run_dir, 0, args.num_files, args.size)
+    syncer = ScratchSyncer(run_dir, durable_dir, start=False)
+    full, full_seconds = timed(syncer.sync_once)
+    unchanged, unchanged_seconds = timed(syncer.sync_once)
+    num_changed = int(args.changed*args.num_files)
+    write_files(run_dir, 0, num_changed, args.size)
+    changed, changed_seconds = timed(syncer.sync_once)
+    syncer.close()
+    assert (full, unchanged) == (args.num_files, 0), (full, unchanged)
+    assert changed == num_changed, (changed, num_changed)
+    assert mismatches(run_dir, durable_dir) == []
+
+    # A run whose job crashed halfway, and one that is still running.
+    crashed_dir = os.path.join(mirror, "wandb", "run-crashed")
+    half = args.num_files // 2
+    context = multiprocessing.get_context("fork")
+    job = context.Process(target=crashed_job,
+        args=(crashed_dir, scratch_sync.durable_path(scratch_root, base_dir, crashed_dir),
+              half, args.size))
+    job.start()
+    job.join()
+    running_dir = os.path.join(mirror, "runs", "run-running")
+    write_files(running_dir, 0, 1, args.size)
+    running = ScratchSyncer(running_dir,
+        scratch_sync.durable_path(scratch_root, base_dir, running_dir), start=False)
+
+    recovered, recover_seconds = timed(scratch_sync.recover, scratch_root, base_dir)
+    assert recovered == {crashed_dir: half}, recovered
+    assert mismatches(crashed_dir, scratch_sync.durable_path(scratch_root, base_dir,
+                                                             crashed_dir)) == []
+    again, again_seconds = timed(scratch_sync.recover, scratch_root, base_dir)
+    assert again == {}, again
+    running.close()
+
+    megabytes = args.num_files*args.size/2**20
+    print("full pass         %8.3f s (%.1f MB/s)" % (full_seconds, megabytes/full_seconds))
+    print("unchanged pass    %8.3f s" % unchanged_seconds)
+    print("%3d%% changed      %8.3f s" % (100*args.changed, changed_seconds))
+    print("recover           %8.3f s for %d files, %.4f s when nothing is left"
+          % (recover_seconds, half, again_seconds))
+    print(utils.colorize("durable copies match scratch", color="green", bold=True))
+    return full_seconds, unchanged_seconds, changed_seconds, recover_seconds
+
+if __name__ == '__main__':
+    main()
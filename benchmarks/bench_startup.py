@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+
+#==============================================================================
+# Cold start benchmark for wandb_setup. Every case runs in a fresh
+# interpreter. Exits with a non-zero status if a case is slower than its
+# budget or if a heavy module got imported on the fast path.
+#==============================================================================
+
+# Modules that must not be imported by the fast path.
+HEAVY_MODULES = ["numpy", "wandb", "subprocess"]
+
+CASES = {
+    "python": ["-c", "pass"],
+    "import": ["-c", "import wandb_setup"],
+    "help": ["wandb_setup.py", "--help"],
+    "validate_only": ["wandb_setup.py", "--validate_only", "-ia", "2"],
+}
+
+# Budgets in milliseconds on top of the bare interpreter start up time.
+BUDGETS = {
+    "import": 75,
+    "help": 100,
+    "validate_only": 100,
+}
+
+CHECK_IMPORTS = ("import sys, wandb_setup; "
+                 "wandb_setup.main(['--validate_only']); "
+                 "print('imported:', *[m for m in %r if m in sys.modules])" % HEAVY_MODULES)
+
+def time_case(args, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times)//2]
+
+def heavy_imports():
+    out = subprocess.run([sys.executable, "-c", CHECK_IMPORTS], cwd=ROOT,
+                         check=True, capture_output=True, text=True).stdout
+    return out.splitlines()[-1].split()[1:]
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", "-r", type=int, default=11)
+    parser.add_argument("--baseline", "-b", type=str, default=None,
+        help="Json file with per case budgets (ms) that replace the defaults.")
+    parser.add_argument("--output", "-o", type=str, default=None,
+        help="Write the measured timings to this json file.")
+    args = parser.parse_args(raw_args)
+
+    budgets = dict(BUDGETS)
+    if args.baseline is not None:
+        budgets.update(utils.load_dict_from_json(args.baseline))
+
+    results = {case: time_case(argv, args.repeats) for case, argv in CASES.items()}
+    failed = False
+    for case, ms in results.items():
+        if case not in budgets:
+            print("%-15s %8.1f ms" % (case, ms))
+            continue
+        overhead = ms - results["python"]
+        ok = overhead <= budgets[case]
+        failed |= not ok
+        print(utils.colorize("%-15s %8.1f ms (+%.1f ms, budget %d ms)"
+              % (case, ms, overhead, budgets[case]),
+              color="green" if ok else "red", bold=not ok))
+
+    imported = heavy_imports()
+    if len(imported) > 0:
+        failed = True
+        print(utils.colorize("Fast path imported: %s" % ', '.join(imported),
+              color="red", bold=True))
+
+    if args.output is not None:
+        utils.save_dict_as_json(results, args.output)
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import json
+import pickle
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import utils
+import storage
+
+#==============================================================================
+# Write/read throughput of the result storage layer for large result dicts.
+#==============================================================================
+
+def make_results(size_mb, num_arrays=8, num_scalars=1000):
+    n = int(size_mb * 2**20 / 8 / num_arrays)
+    rng = np.random.default_rng(0)
+    results = {"array_%d" % i: rng.standard_normal(n) for i in range(num_arrays)}
+    results["scalars"] = {"metric_%d" % i: float(i) for i in range(num_scalars)}
+    return results
+
+def legacy_save_json(dic, path):
+    # What utils.save_dict_as_json used to do; arrays have to become lists.
+    dic = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in dic.items()}
+    with open(path, 'w') as out:
+        out.write(json.dumps(dic, separators=(',\n','\t:\t'), sort_keys=True))
+
+def legacy_load_json(path):
+    with open(path, 'rb') as f:
+        return json.load(f)
+
+def legacy_save_pkl(dic, path):
+    with open(path, 'wb') as out:
+        pickle.dump(dic, out, protocol=pickle.HIGHEST_PROTOCOL)
+
+def legacy_load_pkl(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def touch(dic):
+    # Make lazily loaded arrays actually hit the disk.
+    return sum(float(v.sum()) for v in dic.values() if isinstance(v, np.ndarray))
+
+def dir_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f))
+               for d, _, files in os.walk(path) for f in files)
+
+def bench(name, save, load, results, tmp_dir, size_mb, read_all):
+    case_dir = os.path.join(tmp_dir, name)
+    os.makedirs(case_dir)
+    path = os.path.join(case_dir, "results")
+
+    start = time.perf_counter()
+    saved = save(results, path) or path
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = load(saved)
+    if read_all:
+        touch(loaded)
+    read = time.perf_counter() - start
+
+    out = dict(write_s=write, read_s=read, write_mb_s=size_mb/write,
+               read_mb_s=size_mb/read, disk_mb=dir_size(case_dir)/2**20)
+    shutil.rmtree(case_dir)
+    return out
+
+CASES = {
+    "legacy_json": (legacy_save_json, legacy_load_json),
+    "legacy_pkl": (legacy_save_pkl, legacy_load_pkl),
+    "pkl": (storage.save_pickle, storage.load_pickle),
+    "save_dict": (storage.save_dict, storage.load_dict),
+    "save_dict_no_mmap": (storage.save_dict,
+                          lambda p: storage.load_dict(p, mmap=False)),
+    "save_dict_compressed": (lambda d, p: storage.save_dict(d, p, compress=True),
+                             storage.load_dict),
+}
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size_mb", "-mb", type=float, default=256)
+    parser.add_argument("--cases", "-c", type=str, nargs='*', default=list(CASES))
+    parser.add_argument("--read_all", "-ra", action="store_true",
+        help="Sum every array after loading so memory mapped reads are counted.")
+    parser.add_argument("--tmp_dir", "-td", type=str, default=None)
+    parser.add_argument("--output", "-o", type=str, default=None)
+    args = parser.parse_args(raw_args)
+
+    results = make_results(args.size_mb)
+    report = {}
+    tmp_dir = tempfile.mkdtemp(dir=args.tmp_dir)
+    try:
+        for name in args.cases:
+            save, load = CASES[name]
+            report[name] = bench(name, save, load, results, tmp_dir,
+                                 args.size_mb, args.read_all)
+            r = report[name]
+            print("%-22s write %8.1f MB/s  read %9.1f MB/s  disk %8.1f MB"
+                  % (name, r["write_mb_s"], r["read_mb_s"], r["disk_mb"]))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if args.output is not None:
+        utils.save_dict_as_json(report, args.output)
+    return report
+
+if __name__ == '__main__':
+    main()
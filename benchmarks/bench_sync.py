@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import http.server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+import bulk_sync
+from blob_store import BlobStore
+from run_index import RunIndex
+
+#==============================================================================
+# bulk_sync against a local stand-in for the upload server, with injected
+# latency and failures.
+#==============================================================================
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    latency = 0.
+    failure_rate = 0.
+    received = {}
+    lock = threading.Lock()
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path in self.received else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PUT(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            self.send_response(503)
+        else:
+            with self.lock:
+                self.received[self.path] = len(data)
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def start_server(latency, failure_rate):
+    StandInHandler.latency = latency
+    StandInHandler.failure_rate = failure_rate
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%d" % server.server_address[1]
+
+def make_runs(root_dir, num_runs, files_per_run, file_kb, shared_kb=0):
+    """
+    Offline run directories laid out like wandb's, added to the index. With
+    shared_kb every run also saves the same file through the blob store.
+    """
+    index = RunIndex(root_dir)
+    store = BlobStore(os.path.join(root_dir, "blobs"))
+    payload = os.urandom(file_kb * 1024)
+    shared = os.path.join(root_dir, "expert.bin")
+    with open(shared, 'wb') as f:
+        f.write(os.urandom(shared_kb * 1024))
+    for i in range(num_runs):
+        save_dir = os.path.join(root_dir, "ABC", "wandb",
+                                "offline-run-%06d" % i, "files")
+        os.makedirs(save_dir)
+        for j in range(files_per_run):
+            with open(os.path.join(save_dir, "file_%d.bin" % j), 'wb') as f:
+                f.write(payload)
+        if shared_kb > 0:
+            utils.save_file(shared, save_dir, store=store)
+        index.start(save_dir, {"project": "ABC", "int_arg": i})
+        index.finish(save_dir)
+    index.close()
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_runs", "-nr", type=int, default=200)
+    parser.add_argument("--files_per_run", "-fr", type=int, default=4)
+    parser.add_argument("--file_kb", "-fk", type=int, default=64)
+    parser.add_argument("--shared_kb", "-sk", type=int, default=1024,
+        help="Size of a file every run shares through the blob store. 0 for none.")
+    parser.add_argument("--num_workers", "-nw", type=int, nargs='*', default=[1, 4, 16])
+    parser.add_argument("--latency", "-la", type=float, default=0.005,
+        help="Seconds the server takes per request.")
+    parser.add_argument("--failure_rate", "-fa", type=float, default=0.05)
+    args = parser.parse_args(raw_args)
+
+    server, url = start_server(args.latency, args.failure_rate)
+    results = []
+    try:
+        for num_workers in args.num_workers:
+            root_dir = tempfile.mkdtemp()
+            make_runs(root_dir, args.num_runs, args.files_per_run, args.file_kb,
+                      args.shared_kb)
+            StandInHandler.received.clear()
+            uploader = bulk_sync.HttpUploader(url)
+
+            start = time.perf_counter()
+            synced, failed = bulk_sync.bulk_sync(root_dir, uploader, num_workers,
+                                                 retries=8, backoff=0.01)
+            seconds = time.perf_counter() - start
+            # Own files and the blob manifest of every run, the shared blob once.
+            expected = args.num_runs * args.files_per_run
+            if args.shared_kb > 0:
+                expected += args.num_runs + 1
+            assert len(failed) == 0 and len(StandInHandler.received) == expected
+
+            # Everything is recorded as synced, so a rerun uploads nothing.
+            synced_again, _ = bulk_sync.bulk_sync(root_dir, uploader, num_workers)
+            assert len(synced_again) == 0
+            results.append((num_workers, seconds))
+    finally:
+        server.shutdown()
+
+    for num_workers, seconds in results:
+        print("workers %3d  %7.2f s  %8.1f runs/s"
+              % (num_workers, seconds, args.num_runs / seconds))
+    return results
+
+if __name__ == '__main__':
+    main()
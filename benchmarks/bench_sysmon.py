@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+from sys_monitor import SystemMonitor
+
+#==============================================================================
+# Overhead of sys_monitor.SystemMonitor. Exits with a non-zero status if the
+# monitor uses more cpu than its budget.
+#==============================================================================
+
+# Budget: percent of one core used by the sampling thread, per interval.
+BUDGETS = {
+    0.1: 1.,
+    0.01: 5.,
+}
+
+def sample_cost(repeats):
+    """Microseconds per sample (best of repeats)."""
+    monitor = SystemMonitor(interval=1., start=False)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        monitor.sample()
+        best = min(best, time.perf_counter() - start)
+    monitor.close()
+    return 1e6*best
+
+def cpu_overhead(interval, seconds):
+    """
+    Percent of one core the process uses while the main thread sleeps and
+    the monitor samples every interval seconds, minus the same without it.
+    """
+    def measure(monitor_on):
+        start_cpu, start = time.process_time(), time.perf_counter()
+        monitor = SystemMonitor(interval=interval) if monitor_on else None
+        time.sleep(seconds)
+        if monitor is not None:
+            monitor.close()
+        return 100*(time.process_time() - start_cpu)/(time.perf_counter() - start)
+    return measure(True) - measure(False)
+
+def main(raw_args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", "-s", type=float, default=3.)
+    parser.add_argument("--repeats", "-r", type=int, default=1000)
+    args = parser.parse_args(raw_args)
+
+    print("sample            %8.1f us" % sample_cost(args.repeats))
+    failed = False
+    for interval, budget in BUDGETS.items():
+        overhead = cpu_overhead(interval, args.seconds)
+        ok = overhead <= budget
+        failed |= not ok
+        print(utils.colorize("interval %5.2f s  %6.2f %% cpu (budget %.1f %%)"
+              % (interval, overhead, budget),
+              color="green" if ok else "red", bold=not ok))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
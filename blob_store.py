@@ -0,0 +1,121 @@
+import os
+import uuid
+import shutil
+import hashlib
+
+import storage
+
+#==============================================================================
+# Content addressed store for files that many runs save identically
+# (datasets, expert demonstrations, pretrained weights).
+#==============================================================================
+
+MANIFEST = "blob_manifest.json"
+
+def hash_file(path, chunk_size=1 << 20):
+    """sha256 of the file at path, read in chunks so memory use stays flat."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BlobStore:
+    """
+    Keeps one read-only copy of every distinct file under
+    root/<first two hex digits>/<sha256>. Run directories hold hard links to
+    the blobs (symlinks when the store is on another filesystem), and a
+    manifest in every run directory maps file names to digests so uploads
+    can skip blobs the remote already has (see bulk_sync.HttpUploader).
+
+        store = BlobStore(os.path.join(root_dir, "blobs"))
+        store.add_file(expert_path, save_dir)       # copy in, deduplicated
+        store.add(os.path.join(save_dir, "weights.pkl"), save_dir)   # in place
+
+    Blobs are shared between runs, so files in a run directory must be
+    replaced (as the storage helpers do) rather than modified in place.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, path, digest=None, move=False):
+        """Store the file at path (moved there if move) and return its digest."""
+        digest = hash_file(path) if digest is None else digest
+        blob = self.path(digest)
+        if os.path.exists(blob):
+            return digest
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp = "%s.tmp-%s" % (blob, uuid.uuid4().hex[:8])
+        try:
+            if move:
+                shutil.move(path, tmp)
+            else:
+                shutil.copyfile(path, tmp)
+            os.chmod(tmp, 0o444)
+            # Another process may have stored the same blob meanwhile; either
+            # copy is fine.
+            os.replace(tmp, blob)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return digest
+
+    def link(self, digest, dest):
+        """Make dest refer to the blob, replacing whatever is at dest."""
+        tmp = "%s.tmp-%s" % (dest, uuid.uuid4().hex[:8])
+        try:
+            os.link(self.path(digest), tmp)
+        except OSError:
+            os.symlink(os.path.abspath(self.path(digest)), tmp)
+        os.replace(tmp, dest)
+
+    def add(self, path, run_dir):
+        """
+        Deduplicate a file that already is in run_dir: store it, replace it
+        with a link to the blob and record it in the manifest of run_dir.
+        """
+        if os.path.islink(path):
+            # Already a reference to a blob.
+            digest = os.path.basename(os.readlink(path))
+        else:
+            digest = self.put(path, move=True)
+            self.link(digest, path)
+        self.record(run_dir, {os.path.relpath(path, run_dir): digest})
+        return digest
+
+    def add_file(self, src, run_dir, name=None):
+        """Put a copy of src (e.g. a dataset) into run_dir/name without duplicating it."""
+        dest = os.path.join(run_dir, os.path.basename(src) if name is None else name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        digest = self.put(src)
+        self.link(digest, dest)
+        self.record(run_dir, {os.path.relpath(dest, run_dir): digest})
+        return dest
+
+    def record(self, run_dir, entries):
+        """Add {relative path: digest} to the manifest of run_dir."""
+        manifest = load_manifest(run_dir)
+        # Drop files that have been removed since (e.g. old array directories).
+        manifest = {rel: entry for rel, entry in manifest.items()
+                    if os.path.lexists(os.path.join(run_dir, rel))}
+        for rel, digest in entries.items():
+            manifest[rel.replace(os.sep, '/')] = {
+                "sha256": digest, "size": os.path.getsize(self.path(digest))}
+        storage.save_json(manifest, os.path.join(run_dir, MANIFEST))
+
+def load_manifest(run_dir):
+    """{relative path: {"sha256", "size"}} of the blobs referenced by run_dir."""
+    path = os.path.join(run_dir, MANIFEST)
+    return storage.load_json(path) if os.path.exists(path) else {}
+
+def find_manifests(run_dir):
+    """Yield (directory, manifest) for every manifest below run_dir."""
+    for dirpath, _, filenames in os.walk(run_dir):
+        if MANIFEST in filenames:
+            yield dirpath, load_manifest(dirpath)
@@ -0,0 +1,215 @@
+import os
+import time
+import random
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+import concurrent.futures
+
+import utils
+
+#==============================================================================
+# Bulk upload of runs that were recorded offline (WANDB_MODE=offline).
+#==============================================================================
+
+class RateLimiter:
+    """
+    Token bucket shared by all upload threads: at most `rate` calls of
+    acquire() per second on average, with bursts of up to `burst`.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last)*self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def with_retries(fn, retries=5, backoff=1., max_backoff=60.):
+    """
+    Call fn until it succeeds, at most retries + 1 times, sleeping backoff,
+    2*backoff, 4*backoff, ... (capped at max_backoff, with jitter) in between.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries:
+                raise
+            delay = min(max_backoff, backoff * 2**attempt)
+            time.sleep(delay * random.uniform(0.5, 1.))
+
+def run_dir_of(save_dir):
+    """wandb keeps the files of a run in <run_dir>/files; sync takes run_dir."""
+    save_dir = save_dir.rstrip(os.sep)
+    if os.path.basename(save_dir) == "files":
+        return os.path.dirname(save_dir)
+    return save_dir
+
+class WandbSyncUploader:
+    """Uploads a run with `wandb sync`, which needs the network and an API key."""
+    def __init__(self, extra_args=[]):
+        self.extra_args = list(extra_args)
+
+    def __call__(self, run_dir, limiter=None):
+        if limiter is not None:
+            limiter.acquire()
+        result = subprocess.run(["wandb", "sync"] + self.extra_args + [run_dir],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            raise RuntimeError(result.stdout.decode(errors="replace")[-2000:])
+
+class HttpUploader:
+    """
+    PUTs every file of a run to <url>/<run name>/<relative path>. Works
+    against any server that accepts PUT, e.g. a small http.server handler
+    standing in for the real backend (see benchmarks/bench_sync.py).
+    Every request counts against the rate limit.
+
+    Files listed in a blob manifest (see blob_store.py) are uploaded once per
+    content to <url>/blobs/<sha256>, and only if a HEAD request shows that the
+    remote does not have them yet; the manifest itself is uploaded like any
+    other file so the remote can resolve the references.
+    """
+    def __init__(self, url, timeout=60.):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.remote_blobs = set()
+
+    def request(self, url, data=None, method="PUT", limiter=None, headers={}):
+        if limiter is not None:
+            limiter.acquire()
+        request = urllib.request.Request(url, data=data, method=method, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def put_file(self, url, path, limiter=None):
+        # Streamed from disk: blobs can be datasets or weights of several GB,
+        # and every worker thread uploads one at a time.
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.request(url, f, limiter=limiter, headers={"Content-Length": str(size)})
+
+    def upload_blob(self, digest, path, limiter=None):
+        if digest in self.remote_blobs:
+            return
+        url = "%s/blobs/%s" % (self.url, digest)
+        try:
+            self.request(url, method="HEAD", limiter=limiter)
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            self.put_file(url, path, limiter)
+        self.remote_blobs.add(digest)
+
+    def __call__(self, run_dir, limiter=None):
+        from blob_store import find_manifests
+        name = os.path.basename(run_dir)
+        blobs = {}
+        for dirpath, manifest in find_manifests(run_dir):
+            for rel, entry in manifest.items():
+                blobs[os.path.normpath(os.path.join(dirpath, rel))] = entry["sha256"]
+
+        for dirpath, _, filenames in os.walk(run_dir):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if os.path.normpath(path) in blobs:
+                    self.upload_blob(blobs[os.path.normpath(path)], path, limiter)
+                    continue
+                rel = os.path.relpath(path, run_dir)
+                url = "%s/%s/%s" % (self.url, urllib.parse.quote(name),
+                                    urllib.parse.quote(rel.replace(os.sep, '/')))
+                self.put_file(url, path, limiter)
+
+def bulk_sync(root_dir, uploader=None, num_workers=8, rate=None, retries=5,
+              backoff=1., status="completed", **filters):
+    """
+    Upload every run in the RunIndex of root_dir (see wandb_setup.get_root_dir)
+    that matches status and filters (e.g. project="ABC", group="sweep") and
+    has not been synced yet, num_workers at a time. Every result is recorded
+    in the index right away, so an interrupted or partially failed sync is
+    continued by calling bulk_sync again. Returns (synced, failed) save_dirs.
+    """
+    from run_index import RunIndex
+    uploader = WandbSyncUploader() if uploader is None else uploader
+    limiter = RateLimiter(rate, burst=max(1, num_workers)) if rate else None
+
+    index = RunIndex(root_dir)
+    save_dirs = index.unsynced(status, **filters)
+    print(utils.colorize("Syncing %d runs with %d workers" % (len(save_dirs), num_workers),
+          color="green", bold=True))
+
+    def upload(save_dir):
+        return with_retries(lambda: uploader(run_dir_of(save_dir), limiter),
+                            retries, backoff)
+
+    synced, failed = [], []
+    try:
+        # The index is only touched from this thread.
+        with concurrent.futures.ThreadPoolExecutor(num_workers) as pool:
+            futures = {pool.submit(upload, save_dir): save_dir for save_dir in save_dirs}
+            for future in concurrent.futures.as_completed(futures):
+                save_dir = futures[future]
+                error = future.exception()
+                index.mark_synced(save_dir, None if error is None else repr(error))
+                if error is None:
+                    synced.append(save_dir)
+                else:
+                    failed.append(save_dir)
+                    print(utils.colorize("Failed to sync %s: %r" % (save_dir, error),
+                          color="red", bold=True))
+    finally:
+        index.close()
+    print(utils.colorize("Synced %d runs, %d failed" % (len(synced), len(failed)),
+          color="green" if len(failed) == 0 else "yellow", bold=True))
+    return synced, failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root_dir", "-rd", type=str, default=None,
+        help="Directory with runs.sqlite. Defaults to wandb_setup.get_root_dir().")
+    parser.add_argument("--project", "-p", type=str, default=None)
+    parser.add_argument("--group", "-g", type=str, default=None)
+    parser.add_argument("--status", "-st", type=str, default="completed",
+        help="Only sync runs with this status ('any' for all).")
+    parser.add_argument("--num_workers", "-nw", type=int, default=8)
+    parser.add_argument("--rate", "-ra", type=float, default=None,
+        help="Maximum uploads (wandb sync calls or http requests) per second.")
+    parser.add_argument("--retries", "-re", type=int, default=5)
+    parser.add_argument("--backoff", "-bo", type=float, default=1.,
+        help="Seconds before the first retry; doubles with every retry.")
+    parser.add_argument("--url", type=str, default=None,
+        help="PUT the files to this http endpoint instead of running wandb sync.")
+    parser.add_argument("--index_existing", action="store_true",
+        help="First add runs that predate the index (status 'unknown').")
+    args = parser.parse_args()
+
+    if args.root_dir is None:
+        import wandb_setup
+        args.root_dir = wandb_setup.get_root_dir()
+    if args.index_existing:
+        from run_index import RunIndex
+        index = RunIndex(args.root_dir)
+        index.add_existing(args.root_dir)
+        index.close()
+    filters = {k: getattr(args, k) for k in ["project", "group"]
+               if getattr(args, k) is not None}
+    uploader = HttpUploader(args.url) if args.url is not None else None
+    _, failed = bulk_sync(args.root_dir, uploader, args.num_workers, args.rate,
+                          args.retries, args.backoff,
+                          None if args.status == "any" else args.status, **filters)
+    raise SystemExit(1 if len(failed) > 0 else 0)
@@ -0,0 +1,129 @@
+import os
+import copy
+import pickle
+import hashlib
+import importlib.util
+
+import utils
+import storage
+
+#==============================================================================
+# Loading of config files passed through --config_file.
+#==============================================================================
+
+# Parsed configs are cached in memory and on disk, keyed by path. An entry is
+# only used while the mtime and size of the file (and of every base config it
+# pulls in) are unchanged. Python configs can import other modules or read
+# the environment, which the stamps do not cover, so they are only cached in
+# memory.
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                         "wandb-starter-code", "configs")
+BASE_KEY = "_base_"
+
+_cache = {}
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def module_name(path):
+    """Name used as prefix of run names for python config files."""
+    return os.path.splitext(os.path.normpath(path))[0].replace(os.sep, '.')
+
+def parse_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("pyyaml is needed to load %s" % path)
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=loader) or {}
+
+def parse_python(path):
+    spec = importlib.util.spec_from_file_location(module_name(path), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.config
+
+def parse_file(path):
+    if path.endswith((".yaml", ".yml")):
+        return parse_yaml(path)
+    elif path.endswith((".json", ".json.gz")):
+        return utils.load_dict_from_json(path)
+    elif path.endswith(".py"):
+        return parse_python(path)
+    else:
+        raise ValueError("Invalid type of config file")
+
+def merge(base, override):
+    """Recursively merge override into a copy of base."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def compose(path):
+    """
+    Parse path and the base configs it names under the _base_ key (a path or
+    a list of paths relative to path). Later bases and the file itself take
+    precedence. Returns the config and the stamps of every file read.
+    """
+    config = parse_file(path)
+    stamps = {path: file_stamp(path)}
+    bases = config.pop(BASE_KEY, [])
+    if isinstance(bases, str):
+        bases = [bases]
+
+    composed = {}
+    for base in bases:
+        base = os.path.normpath(os.path.join(os.path.dirname(path), base))
+        base_config, base_stamps = compose(base)
+        composed = merge(composed, base_config)
+        stamps.update(base_stamps)
+    return merge(composed, config), stamps
+
+def is_fresh(stamps):
+    try:
+        return all(file_stamp(p) == stamp for p, stamp in stamps.items())
+    except OSError:
+        return False
+
+def disk_cache_path(path):
+    return os.path.join(CACHE_DIR, hashlib.sha1(path.encode('utf-8')).hexdigest() + ".pkl")
+
+def load_config(path, overrides=None, use_disk_cache=True):
+    """
+    Load a yaml, json or python config file (python files must define a
+    dict called config) and merge overrides into it. Returns a fresh copy
+    that the caller is free to modify.
+    """
+    path = os.path.abspath(path)
+    entry = _cache.get(path)
+    if entry is None or not is_fresh(entry[0]):
+        entry = None
+        if use_disk_cache and not path.endswith(".py") and \
+                os.path.exists(disk_cache_path(path)):
+            try:
+                entry = storage.load_pickle(disk_cache_path(path))
+            except Exception:
+                entry = None
+            if entry is not None and not is_fresh(entry[0]):
+                entry = None
+        if entry is None:
+            config, stamps = compose(path)
+            entry = (stamps, config)
+            if use_disk_cache and not any(p.endswith(".py") for p in stamps):
+                try:
+                    os.makedirs(CACHE_DIR, exist_ok=True)
+                    storage.save_pickle(entry, disk_cache_path(path))
+                except (OSError, pickle.PicklingError, TypeError):
+                    pass
+        _cache[path] = entry
+
+    config = copy.deepcopy(entry[1])
+    if overrides is not None:
+        config = merge(config, overrides)
+    return config
@@ -0,0 +1,170 @@
+import os
+import sys
+import shlex
+import random
+import argparse
+import multiprocessing
+
+import utils
+
+#==============================================================================
+# Launch many runs of wandb_setup.main on a pool of long-lived workers.
+#==============================================================================
+
+wandb_setup = None
+
+def reseed():
+    """
+    Draw fresh seeds for random and numpy.random. Forked processes inherit
+    the parent's random state, so without this every worker would give runs
+    without an explicit seed the same one.
+    """
+    import numpy
+    random.seed()
+    numpy.random.seed()
+
+def init_worker(slots=None):
+    """
+    Runs once in every worker process. Pays for the heavy imports and the
+    parser construction up front so that each run only pays for its own
+    wandb.init. With slots (a queue of placement.plan entries) the worker
+    first takes a set of cores and pins itself to it, before numpy is
+    imported so that the BLAS thread limits take effect.
+    """
+    global wandb_setup
+    if slots is not None:
+        import placement
+        _, cpus = slots.get()
+        placement.apply(cpus)
+    import numpy
+    import wandb
+    reseed()
+    import wandb_setup as _wandb_setup
+    wandb_setup = _wandb_setup
+    wandb_setup.get_parser()
+
+def run_one(raw_args):
+    return wandb_setup.main(raw_args)
+
+def has_seed(raw_args):
+    for arg in raw_args:
+        if arg.split('=')[0] in ["--seed", "-s"]:
+            return True
+    return False
+
+def prepare_jobs(raw_args_list, base_seed=None):
+    """
+    Lazily turn raw_args_list into argument lists, giving every job its own
+    seed (base_seed + index) unless one was passed explicitly. wandb already
+    gives every run its own directory under base_dir, so nothing else is
+    needed to keep runs apart.
+    """
+    for i, raw_args in enumerate(raw_args_list):
+        if isinstance(raw_args, str):
+            raw_args = shlex.split(raw_args)
+        raw_args = list(raw_args)
+        if base_seed is not None and not has_seed(raw_args):
+            raw_args += ["--seed", str(base_seed + i)]
+        yield raw_args
+
+def load_sweep_file(sweep_file):
+    """
+    A sweep file is either a json list whose entries are lists of arguments
+    or strings that are split like a shell command line, e.g.
+
+        [["-ia", "2", "-fa", "0.5"], "-ia 3 -fa 0.1"]
+
+    or a yaml/json/python sweep spec (see sweep.Sweep), which is expanded
+    lazily.
+    """
+    import config_loader
+    if sweep_file.endswith(".json"):
+        spec = utils.load_dict_from_json(sweep_file)
+        if isinstance(spec, list):
+            return spec
+    else:
+        spec = config_loader.load_config(sweep_file)
+    return make_sweep(spec)
+
+def make_sweep(spec):
+    import wandb_setup
+    from sweep import Sweep
+    return Sweep(spec, wandb_setup.get_parser())
+
+def config_files(raw_args_list):
+    """Config files used by raw_args_list (a list or a Sweep)."""
+    import wandb_setup
+    from sweep import Sweep
+    if isinstance(raw_args_list, Sweep):
+        return set(raw_args_list.values("config_file") or [])
+    parser = wandb_setup.get_parser()
+    return {parser.parse_args(shlex.split(raw_args) if isinstance(raw_args, str)
+                              else raw_args).config_file
+            for raw_args in raw_args_list}
+
+def preload_configs(files):
+    """
+    Parse every config file once in this process. Forked workers inherit the
+    in-memory cache and the disk cache covers the rest.
+    """
+    import config_loader
+    for config_file in files:
+        if config_file is not None:
+            config_loader.load_config(config_file)
+
+def launch(raw_args_list, num_workers=None, base_seed=None, cores_per_run=None):
+    """
+    Run wandb_setup.main once for every entry of raw_args_list (a list of
+    argument lists or a sweep.Sweep) using num_workers processes (defaults to
+    the number of cores, or cores / cores_per_run) and return the list of
+    save_dirs in the same order. With cores_per_run every worker is pinned
+    to its own cores (see placement.py).
+    """
+    from sweep import Sweep
+    preload_configs(config_files(raw_args_list))
+    if isinstance(raw_args_list, Sweep):
+        jobs = prepare_jobs(raw_args_list.iter_raw_args(), base_seed)
+    else:
+        jobs = prepare_jobs(raw_args_list, base_seed)
+
+    if num_workers is None:
+        num_workers = len(os.sched_getaffinity(0)) // (cores_per_run or 1)
+    num_workers = max(1, min(num_workers, len(raw_args_list)))
+
+    context = multiprocessing.get_context()
+    slots = None
+    if cores_per_run is not None:
+        import placement
+        # Forked workers would inherit BLAS already set up for all cores.
+        if "numpy" in sys.modules:
+            context = multiprocessing.get_context("spawn")
+        slots = context.Queue()
+        for slot in placement.plan(num_workers, cores_per_run):
+            slots.put(slot)
+
+    # Pinned runs always get a worker process: placement.apply would pin the
+    # caller for good and leave its thread limits behind.
+    if num_workers == 1 and slots is None:
+        init_worker(slots)
+        return [run_one(raw_args) for raw_args in jobs]
+
+    with context.Pool(num_workers, initializer=init_worker, initargs=(slots,)) as pool:
+        return list(pool.imap(run_one, jobs, chunksize=1))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sweep_file", type=str,
+        help="Json list with the arguments of every run or a sweep spec.")
+    parser.add_argument("--num_workers", "-w", type=int, default=None,
+        help="Number of worker processes. Defaults to number of cores.")
+    parser.add_argument("--base_seed", "-bs", type=int, default=None,
+        help="Runs without an explicit seed get base_seed + their index.")
+    parser.add_argument("--cores_per_run", "-cpr", type=int, default=None,
+        help="Pin every worker to this many cores of its own and limit its \
+              BLAS/OpenMP threads to match.")
+    args = parser.parse_args()
+
+    save_dirs = launch(load_sweep_file(args.sweep_file), args.num_workers,
+                       args.base_seed, args.cores_per_run)
+    for save_dir in save_dirs:
+        print(utils.colorize(save_dir, color="green", bold=True))
@@ -0,0 +1,168 @@
+import time
+import threading
+import collections
+
+import numpy as np
+
+import utils
+
+#==============================================================================
+# Batched, asynchronous metric logging.
+#==============================================================================
+
+class BatchedLogger:
+    """
+    Drop-in replacement for calling run.log from a hot loop.
+
+    Values passed to log() are written into preallocated numpy buffers. Every
+    `window` steps the buffers are reduced to mean/min/max/last and the
+    aggregate is queued. A background thread sends the queue to the run every
+    `flush_interval` seconds, or earlier once the queue holds more than
+    `max_bytes`. The training loop therefore never blocks on wandb.
+
+    The logger hooks into run.finish so that everything still buffered is
+    sent before the run is closed.
+
+    With a metrics_log (see metrics_log.MetricsLog) every aggregate is also
+    appended to it, giving the run a local record that is closed with the
+    logger.
+
+        logger = BatchedLogger(run, window=100)
+        for step in range(config.timesteps):
+            ...
+            logger.log({"reward": reward, "loss": loss}, step)
+        run.finish()
+    """
+    def __init__(self, run, window=100, flush_interval=10.0, max_bytes=1<<20,
+                 capacity=None, metrics_log=None):
+        self.run = run
+        self.metrics_log = metrics_log
+        self.window = window
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        # A key may be logged more than once per step, so allow some slack.
+        self.capacity = capacity if capacity is not None else 4*window
+
+        self.buffers = {}
+        self.counts = {}
+        self.step = 0
+        self.window_end = window
+        self.last_step = None
+
+        self.pending = collections.deque()
+        self.pending_bytes = 0
+        self.unsent = 0
+        self.failed = 0
+        self.cond = threading.Condition()
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+        self._run_finish = run.finish
+        run.finish = self.finish
+
+    def log(self, metrics, step=None):
+        if step is None:
+            step = self.step
+            self.step += 1
+        if step >= self.window_end:
+            self._close_window()
+            self.window_end = (step // self.window + 1) * self.window
+        self.last_step = step
+
+        for key, value in metrics.items():
+            buf = self.buffers.get(key)
+            if buf is None:
+                buf = self.buffers[key] = np.empty(self.capacity, dtype=np.float64)
+                self.counts[key] = 0
+            count = self.counts[key]
+            if count == self.capacity:
+                self._close_window()
+                count = 0
+            buf[count] = value
+            self.counts[key] = count + 1
+
+    def _close_window(self):
+        record = {}
+        for key, buf in self.buffers.items():
+            count = self.counts[key]
+            if count == 0:
+                continue
+            values = buf[:count]
+            record[key] = values[-1]
+            record[key + "/mean"] = values.mean()
+            record[key + "/min"] = values.min()
+            record[key + "/max"] = values.max()
+            self.counts[key] = 0
+        if len(record) == 0:
+            return
+
+        record = {k: float(v) for k, v in record.items()}
+        if self.metrics_log is not None:
+            self.metrics_log.append(record, self.last_step)
+        nbytes = sum(len(k) + 24 for k in record)
+        with self.cond:
+            self.pending.append((self.last_step, record))
+            self.pending_bytes += nbytes
+            self.unsent += 1
+            if self.pending_bytes >= self.max_bytes:
+                self.cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                if not self.closed and self.pending_bytes < self.max_bytes:
+                    self.cond.wait(self.flush_interval)
+                batch = list(self.pending)
+                self.pending.clear()
+                self.pending_bytes = 0
+                closed = self.closed
+            for step, record in batch:
+                # A failing run.log (e.g. a transient backend error) must not
+                # kill the thread, or nothing would drain the queue anymore.
+                try:
+                    self.run.log(record, step=step)
+                except Exception as e:
+                    self.failed += 1
+                    if self.failed == 1:
+                        print(utils.colorize("BatchedLogger: run.log failed (%r); "
+                              "dropping the record and continuing" % e,
+                              color="red", bold=True))
+            with self.cond:
+                self.unsent -= len(batch)
+                self.cond.notify_all()
+            if closed and len(batch) == 0:
+                return
+
+    def flush(self, timeout=60.):
+        """
+        Send everything logged so far and wait (at most timeout seconds)
+        until it has been sent. Returns whether everything was sent.
+        """
+        self._close_window()
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            self.cond.notify_all()
+            while self.unsent > 0 and self.thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self._close_window()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        if self.metrics_log is not None:
+            self.metrics_log.close()
+        self.run.finish = self._run_finish
+
+    def finish(self, *args, **kwargs):
+        self.close()
+        return self._run_finish(*args, **kwargs)
@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+
+import storage
+
+#==============================================================================
+# Append-only columnar metrics log in a run's save_dir, and a reader that
+# loads it back without parsing text.
+#==============================================================================
+
+SCHEMA = "schema.json"
+HEADER = "header.bin"
+
+class MetricsLog:
+    """
+    One row per append(metrics, step), one memory mapped file per metric
+    (float64, the step is int64). Files are preallocated and doubled when
+    full. Metrics that first appear later are filled with nan for the
+    earlier rows, as are metrics missing from a row.
+
+    The number of complete rows lives in a separate 8 byte header that is
+    only updated after a row has been written, and the schema is replaced
+    atomically, so readers (load_metrics) can read while the run is writing.
+    Opening an existing log appends to it, e.g. when a run is resumed.
+
+        log = MetricsLog(os.path.join(save_dir, "metrics"))
+        log.append({"reward": 1., "loss": 0.5}, step)
+        log.close()
+    """
+    def __init__(self, directory, capacity=1024):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        header_path = os.path.join(directory, HEADER)
+        schema_path = os.path.join(directory, SCHEMA)
+        self.columns = {}
+        if os.path.exists(header_path) and os.path.exists(schema_path):
+            self.header = np.memmap(header_path, dtype=np.int64, mode='r+', shape=(1,))
+            self.length = int(self.header[0])
+            self.schema = storage.load_json(schema_path)
+            sizes = [os.path.getsize(os.path.join(directory, c["file"]))
+                     // np.dtype(c["dtype"]).itemsize for c in self.schema["columns"]]
+            self.capacity = max([capacity, self.length] + sizes)
+            for column in self.schema["columns"]:
+                self.columns[column["name"]] = self._map(column, 'r+')
+        else:
+            self.header = np.memmap(header_path, dtype=np.int64, mode='w+', shape=(1,))
+            self.length = 0
+            self.capacity = capacity
+            self.schema = {"version": 1, "columns": []}
+            self._add_column("step", "int64")
+
+    def _map(self, column, mode):
+        path = os.path.join(self.directory, column["file"])
+        dtype = np.dtype(column["dtype"])
+        if os.path.getsize(path) < self.capacity*dtype.itemsize:
+            os.truncate(path, self.capacity*dtype.itemsize)
+        return np.memmap(path, dtype=dtype, mode=mode, shape=(self.capacity,))
+
+    def _add_column(self, name, dtype="float64"):
+        column = {"name": name, "dtype": dtype,
+                  "file": "%05d.bin" % len(self.schema["columns"])}
+        open(os.path.join(self.directory, column["file"]), 'wb').close()
+        array = self._map(column, 'r+')
+        if dtype == "float64":
+            array[:self.length] = np.nan
+        self.columns[name] = array
+        self.schema["columns"].append(column)
+        storage.save_json(self.schema, os.path.join(self.directory, SCHEMA))
+
+    def _grow(self):
+        self.flush()
+        self.capacity *= 2
+        for column in self.schema["columns"]:
+            self.columns[column["name"]] = self._map(column, 'r+')
+
+    def append(self, metrics, step):
+        if self.length == self.capacity:
+            self._grow()
+        for name in metrics:
+            if name not in self.columns:
+                self._add_column(name)
+        row = self.length
+        for name, array in self.columns.items():
+            if name == "step":
+                array[row] = step
+            else:
+                array[row] = metrics.get(name, np.nan)
+        # Publish the row only once all of its values are in place.
+        self.length += 1
+        self.header[0] = self.length
+
+    def flush(self):
+        for array in self.columns.values():
+            array.flush()
+        self.header.flush()
+
+    def close(self):
+        """Flush and cut the preallocated files down to the rows written."""
+        self.flush()
+        self.columns = {}
+        for column in self.schema["columns"]:
+            os.truncate(os.path.join(self.directory, column["file"]),
+                        self.length*np.dtype(column["dtype"]).itemsize)
+
+def load_metrics(directory, keys=None, mmap=True):
+    """
+    {metric: array} of the log in directory (save_dir/metrics for runs of
+    main()), always including "step". Only the rows complete at the time of
+    the call are returned; with mmap the arrays are read only views of the
+    files.
+    """
+    if os.path.basename(directory.rstrip(os.sep)) != "metrics" and \
+            os.path.isdir(os.path.join(directory, "metrics")):
+        directory = os.path.join(directory, "metrics")
+    length = int(np.fromfile(os.path.join(directory, HEADER), dtype=np.int64, count=1)[0])
+    schema = storage.load_json(os.path.join(directory, SCHEMA))
+    result = {}
+    for column in schema["columns"]:
+        if keys is not None and column["name"] not in keys and column["name"] != "step":
+            continue
+        path = os.path.join(directory, column["file"])
+        if length == 0:
+            result[column["name"]] = np.empty(0, dtype=column["dtype"])
+        elif mmap:
+            result[column["name"]] = np.memmap(path, dtype=column["dtype"],
+                                               mode='r', shape=(length,))
+        else:
+            result[column["name"]] = np.fromfile(path, dtype=column["dtype"], count=length)
+    return result
+
+def load_many(directories, keys):
+    """
+    Load keys from the logs of many runs (e.g. RunIndex(...).query().save_dir)
+    as {key: 2d array} with one nan padded row per run, plus "step".
+    Runs without a log get an all nan row.
+    """
+    runs = []
+    for directory in directories:
+        try:
+            runs.append(load_metrics(directory, keys))
+        except FileNotFoundError:
+            runs.append({})
+    max_length = max([len(run.get("step", ())) for run in runs] + [0])
+    stacked = {}
+    for key in ["step"] + [k for k in keys if k != "step"]:
+        out = np.full((len(runs), max_length), np.nan)
+        for i, run in enumerate(runs):
+            if key in run:
+                out[i, :len(run[key])] = run[key]
+        stacked[key] = out
+    return stacked
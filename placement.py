@@ -0,0 +1,105 @@
+import os
+import sys
+import glob
+
+import utils
+
+#==============================================================================
+# Pinning runs to disjoint sets of cores and limiting their BLAS/OpenMP
+# threads, so that many runs on one node do not oversubscribe it.
+#==============================================================================
+
+# Read by the BLAS/OpenMP libraries when numpy (or torch) is first imported.
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+def parse_cpulist(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in text.strip().split(','):
+        if part == '':
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def numa_nodes():
+    """
+    {numa node: sorted cpus} restricted to the cpus this process may use
+    (e.g. the allocation of a SLURM job). One node 0 without NUMA info.
+    """
+    allowed = os.sched_getaffinity(0)
+    nodes = {}
+    for path in glob.glob("/sys/devices/system/node/node*/cpulist"):
+        node = int(os.path.basename(os.path.dirname(path))[len("node"):])
+        with open(path) as f:
+            cpus = sorted(set(parse_cpulist(f.read())) & allowed)
+        if len(cpus) > 0:
+            nodes[node] = cpus
+    if len(nodes) == 0 or set().union(*nodes.values()) != allowed:
+        return {0: sorted(allowed)}
+    return dict(sorted(nodes.items()))
+
+def plan(num_runs, cores_per_run, nodes=None):
+    """
+    List of (numa node, cpus) for num_runs runs with cores_per_run cores
+    each. Slots are cut from one node at a time so a run never spans two
+    nodes unless a node has fewer than cores_per_run cores. When there are
+    more runs than slots the slots are reused round robin.
+    """
+    nodes = numa_nodes() if nodes is None else nodes
+    slots = []
+    for node, cpus in nodes.items():
+        for i in range(0, len(cpus) - cores_per_run + 1, cores_per_run):
+            slots.append((node, cpus[i:i + cores_per_run]))
+    if len(slots) == 0:
+        # cores_per_run is larger than any node: span nodes.
+        cpus = [cpu for node_cpus in nodes.values() for cpu in node_cpus]
+        slots = [(None, cpus[i:i + cores_per_run])
+                 for i in range(0, max(1, len(cpus) - cores_per_run + 1), cores_per_run)]
+    if num_runs > len(slots):
+        print(utils.colorize("%d runs with %d cores each do not fit on %d cores; "
+              "sharing cores" % (num_runs, cores_per_run, sum(map(len, nodes.values()))),
+              color="yellow", bold=True))
+    return [slots[i % len(slots)] for i in range(num_runs)]
+
+def apply(cpus):
+    """
+    Pin this process to cpus and limit BLAS/OpenMP to len(cpus) threads.
+    The thread limits only take effect if numpy has not been imported yet
+    (or if threadpoolctl is installed).
+    """
+    os.sched_setaffinity(0, cpus)
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(len(cpus))
+    if "numpy" in sys.modules:
+        try:
+            import threadpoolctl
+            threadpoolctl.threadpool_limits(len(cpus))
+        except ImportError:
+            print(utils.colorize("numpy was imported before the thread limits were "
+                  "set; BLAS may still use more threads", color="yellow", bold=True))
+
+def describe():
+    """Placement of this process as recorded in the run config."""
+    cpus = sorted(os.sched_getaffinity(0))
+    nodes = [node for node, node_cpus in numa_nodes().items()
+             if set(cpus) & set(node_cpus)]
+    threads = {var: os.environ[var] for var in THREAD_ENV_VARS if var in os.environ}
+    return {"cpus": format_cpulist(cpus), "num_cpus": len(cpus),
+            "numa_nodes": nodes, "threads": threads}
+
+def format_cpulist(cpus):
+    """[0, 1, 2, 3, 8] -> '0-3,8'"""
+    parts, cpus = [], sorted(cpus)
+    i = 0
+    while i < len(cpus):
+        j = i
+        while j + 1 < len(cpus) and cpus[j + 1] == cpus[j] + 1:
+            j += 1
+        parts.append(str(cpus[i]) if i == j else "%d-%d" % (cpus[i], cpus[j]))
+        i = j + 1
+    return ','.join(parts)
@@ -0,0 +1,118 @@
+import os
+import re
+import signal
+
+import utils
+import storage
+
+#==============================================================================
+# Checkpoints and preemption handling for resumable runs.
+#==============================================================================
+
+class Checkpointer:
+    """
+    Saves training state to checkpoint_dir and finds the latest one again.
+    main() gives every config its own checkpoint_dir (keyed by the config
+    hash), so a requeued job finds the checkpoints of the preempted one.
+
+        state = checkpointer.load_latest()   # None for a fresh run
+        checkpointer.on_preempt(lambda: checkpointer.save(get_state(), step))
+        ...
+        checkpointer.save(get_state(), step)
+    """
+    PATTERN = re.compile(r"^ckpt_(\d+)\.pkl$")
+
+    def __init__(self, checkpoint_dir, keep=2):
+        self.checkpoint_dir = checkpoint_dir
+        self.keep = keep
+        self.callbacks = []
+        self.preempted = False
+        self.previous_handlers = {}
+
+    def checkpoints(self):
+        """(step, path) of every checkpoint, oldest first."""
+        if not os.path.isdir(self.checkpoint_dir):
+            return []
+        found = []
+        for filename in os.listdir(self.checkpoint_dir):
+            match = self.PATTERN.match(filename)
+            if match is not None:
+                found.append((int(match.group(1)),
+                              os.path.join(self.checkpoint_dir, filename)))
+        return sorted(found)
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if len(checkpoints) > 0 else None
+
+    def load_latest(self):
+        """Return (step, state) of the latest checkpoint or None."""
+        latest = self.latest()
+        if latest is None:
+            return None
+        step, path = latest
+        return step, storage.load_pickle(path)
+
+    def save(self, state, step):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = os.path.join(self.checkpoint_dir, "ckpt_%012d.pkl" % step)
+        storage.save_pickle(state, path)
+        for _, old in self.checkpoints()[:-self.keep]:
+            os.remove(old)
+        return path
+
+    def on_preempt(self, callback):
+        """
+        Register a callback (e.g. a final save) to run on preemption.
+        Callbacks run in reverse order of registration.
+        """
+        self.callbacks.append(callback)
+
+    def install_signal_handlers(self, signals=(signal.SIGTERM, signal.SIGUSR1),
+                                exit_on_signal=True):
+        """
+        Run the preemption callbacks when the scheduler sends one of signals
+        (SLURM sends SIGTERM before killing a job, and SIGUSR1 if asked to with
+        --signal=USR1@<seconds>). Afterwards the process exits unless
+        exit_on_signal is False, in which case the training loop should check
+        checkpointer.preempted. Only possible from the main thread. The
+        previous handlers are put back by restore_signal_handlers (or when
+        the run attached with attach(run) finishes).
+        """
+        def handler(signum, frame):
+            if self.preempted:
+                return
+            self.preempted = True
+            print(utils.colorize("Received signal %d, checkpointing" % signum,
+                  color="yellow", bold=True))
+            # Most recently registered first, like atexit.
+            for callback in reversed(self.callbacks):
+                callback()
+            if exit_on_signal:
+                self.restore_signal_handlers()
+                raise SystemExit(128 + signum)
+
+        for signum in signals:
+            previous = signal.signal(signum, handler)
+            self.previous_handlers.setdefault(signum, previous)
+
+    def restore_signal_handlers(self):
+        """
+        Put back the handlers replaced by install_signal_handlers, so that a
+        signal after the run (e.g. a launcher worker being shut down, or the
+        next run of a shard starting) does not run this run's callbacks.
+        """
+        for signum, previous in self.previous_handlers.items():
+            signal.signal(signum, signal.SIG_DFL if previous is None else previous)
+        self.previous_handlers = {}
+
+    def attach(self, run):
+        """Make run.finish() restore the signal handlers once it is done."""
+        run_finish = run.finish
+        def finish(*args, **kwargs):
+            try:
+                return run_finish(*args, **kwargs)
+            finally:
+                self.restore_signal_handlers()
+        run.finish = finish
+        return self
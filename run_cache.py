@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import contextlib
+
+import utils
+
+#==============================================================================
+# Cache of finished runs keyed by a hash of their config.
+#==============================================================================
+
+# The name is derived from the config, the rest only controls how main() runs.
+HASH_IGNORE_KEYS = ["name"] + utils.CONTROL_KEYS
+
+def config_hash(config, ignore_keys=[]):
+    """
+    Stable hash of a config. Keys in ignore_keys (and HASH_IGNORE_KEYS) are
+    left out, so passing e.g. ["seed"] makes runs that only differ in their
+    seed hash the same.
+    """
+    dic = {k: v for k, v in config.items()
+           if k not in ignore_keys and k not in HASH_IGNORE_KEYS}
+    encoded = json.dumps(dic, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:32]
+
+class RunCache:
+    """
+    Sqlite index in base_dir that maps config hash -> save_dir, status, etc.
+    Every update touches a single row, so its cost does not grow with the
+    number of runs, and sqlite's locking lets several launchers on the same
+    filesystem share the index. Entries of an older run_cache.json are
+    imported when the index is first created.
+    """
+    LEGACY_FILE = "run_cache.json"
+
+    def __init__(self, base_dir, filename="run_cache.sqlite"):
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, filename)
+
+    def _create(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                     "key TEXT PRIMARY KEY, entry TEXT)")
+        legacy = os.path.join(self.base_dir, self.LEGACY_FILE)
+        if os.path.exists(legacy) and \
+                conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0:
+            with open(legacy, 'r') as f:
+                conn.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?)",
+                                 [(k, json.dumps(v)) for k, v in json.load(f).items()])
+
+    @contextlib.contextmanager
+    def connect(self, write):
+        # One connection per access: the cache is used from the init thread
+        # (--async_init) and from signal handlers as well as from main().
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            if write:
+                self._create(conn)
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def lookup(self, key):
+        if not os.path.exists(self.path):
+            if not os.path.exists(os.path.join(self.base_dir, self.LEGACY_FILE)):
+                return None
+            # Creates the index from the legacy file.
+            with self.connect(write=True):
+                pass
+        with self.connect(write=False) as conn:
+            row = conn.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def update(self, key, unless_status=(), **fields):
+        """
+        Merge fields into the entry of key. Nothing is changed if the entry's
+        status is in unless_status, e.g. to never mark a completed run
+        preempted.
+        """
+        with self.connect(write=True) as conn:
+            row = conn.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone()
+            entry = {} if row is None else json.loads(row[0])
+            if entry.get("status") in unless_status:
+                return entry
+            entry.update(fields)
+            entry["updated"] = time.time()
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?)",
+                         (key, json.dumps(entry, sort_keys=True)))
+        return entry
+
+    def completed(self, key):
+        """Return the save_dir of key if a run with it has completed."""
+        entry = self.lookup(key)
+        if entry is not None and entry.get("status") == "completed":
+            return entry["save_dir"]
+        return None
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import sqlite3
+
+import numpy as np
+
+#==============================================================================
+# Sqlite index of all runs under the wandb root directory.
+#==============================================================================
+
+BASE_COLUMNS = ["save_dir", "status", "start_time", "end_time", "duration"]
+CONFIG_PREFIX = "c_"
+
+def to_sql(value):
+    if isinstance(value, bool):
+        return int(value)
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return json.dumps(value, default=str)
+
+def column_array(values):
+    """Turn one column of a query into a numpy array of a sensible dtype."""
+    present = [v for v in values if v is not None]
+    if len(present) > 0 and all(isinstance(v, (int, float)) for v in present):
+        if len(present) == len(values) and all(isinstance(v, int) for v in present):
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if len(present) == len(values):
+        return np.array(values, dtype=str)
+    return np.array(values, dtype=object)
+
+class RunIndex:
+    """
+    One row per run with its status, timings, save_dir and one column per
+    config key. main() updates it when a run starts and when it finishes, so
+    looking up runs never needs a walk over the run directories.
+
+        index = RunIndex(root_dir)
+        runs = index.query(project="ABC", int_arg=4)
+        runs.save_dir, runs.float_arg, runs.duration
+    """
+    def __init__(self, root_dir, filename="runs.sqlite"):
+        self.path = os.path.join(root_dir, filename)
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS runs ("
+                          "save_dir TEXT PRIMARY KEY, status TEXT, "
+                          "start_time REAL, end_time REAL, duration REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS syncs ("
+                          "save_dir TEXT PRIMARY KEY, status TEXT, "
+                          "attempts INTEGER, time REAL, error TEXT)")
+        self.conn.commit()
+        self._columns = None
+
+    def close(self):
+        self.conn.close()
+
+    def columns(self):
+        if self._columns is None:
+            self._columns = [row[1] for row in
+                             self.conn.execute("PRAGMA table_info(runs)")]
+        return self._columns
+
+    def _add_config_columns(self, config):
+        known = set(self.columns())
+        for key in config:
+            if CONFIG_PREFIX + key not in known:
+                try:
+                    self.conn.execute('ALTER TABLE runs ADD COLUMN "%s%s"'
+                                      % (CONFIG_PREFIX, key))
+                except sqlite3.OperationalError:
+                    # Another process added it in the meantime.
+                    pass
+        self._columns = None
+
+    def start(self, save_dir, config, start_time=None):
+        """Add (or reset) the row of a run that is starting."""
+        config = {k: v for k, v in config.items()
+                  if not k.startswith('_') and k not in BASE_COLUMNS}
+        start_time = time.time() if start_time is None else start_time
+        with self.conn:
+            self._add_config_columns(config)
+            row = {"save_dir": save_dir, "status": "running",
+                   "start_time": start_time, "end_time": None, "duration": None}
+            row.update({CONFIG_PREFIX + k: to_sql(v) for k, v in config.items()})
+            keys = list(row.keys())
+            self.conn.execute('INSERT OR REPLACE INTO runs (%s) VALUES (%s)'
+                              % (', '.join('"%s"' % k for k in keys),
+                                 ', '.join('?'*len(keys))),
+                              [row[k] for k in keys])
+
+    def finish(self, save_dir, status="completed", end_time=None):
+        end_time = time.time() if end_time is None else end_time
+        with self.conn:
+            self.conn.execute("UPDATE runs SET status = ?, end_time = ?, "
+                              "duration = ? - start_time WHERE save_dir = ?",
+                              (status, end_time, end_time, save_dir))
+
+    def query(self, columns=None, where=None, params=(), **filters):
+        """
+        Return the matching runs as a numpy record array with one field per
+        column. Config keys are addressed by their own name, e.g.
+        query(["save_dir", "float_arg"], status="completed", int_arg=4).
+        A raw sql condition can be passed through where/params.
+        """
+        def sql_name(key):
+            return key if key in BASE_COLUMNS else CONFIG_PREFIX + key
+
+        if columns is None:
+            columns = [c if c in BASE_COLUMNS else c[len(CONFIG_PREFIX):]
+                       for c in self.columns()]
+        conditions, values = [], list(params)
+        for key, value in filters.items():
+            if value is None:
+                conditions.append('"%s" IS NULL' % sql_name(key))
+            else:
+                conditions.append('"%s" = ?' % sql_name(key))
+                values.append(to_sql(value))
+        if where is not None:
+            conditions.append("(%s)" % where)
+
+        sql = "SELECT %s FROM runs" % ', '.join('"%s"' % sql_name(c) for c in columns)
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        rows = self.conn.execute(sql, values).fetchall()
+
+        arrays = [column_array([row[i] for row in rows]) for i in range(len(columns))]
+        return np.rec.fromarrays(arrays, names=columns)
+
+    def unsynced(self, status="completed", **filters):
+        """
+        save_dirs of the runs (with the given status, None for any) that
+        have not been synced yet, e.g. unsynced(project="ABC").
+        """
+        if status is not None:
+            filters["status"] = status
+        runs = self.query(["save_dir"], where="save_dir NOT IN (SELECT save_dir "
+                          "FROM syncs WHERE status = 'synced')", **filters)
+        return list(runs.save_dir)
+
+    def mark_synced(self, save_dir, error=None):
+        """Record a sync attempt of a run; runs with an error are retried later."""
+        with self.conn:
+            row = self.conn.execute("SELECT attempts FROM syncs WHERE save_dir = ?",
+                                    (save_dir,)).fetchone()
+            attempts = 1 if row is None else row[0] + 1
+            self.conn.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?, ?)",
+                              (save_dir, "failed" if error else "synced",
+                               attempts, time.time(), error))
+
+    def add_existing(self, root_dir):
+        """
+        Add runs that predate the index by walking root_dir once and reading
+        their config.json. Only needed the first time.
+        """
+        for dirpath, _, filenames in os.walk(root_dir):
+            if "config.json" not in filenames:
+                continue
+            path = os.path.join(dirpath, "config.json")
+            with open(path, 'r') as f:
+                config = json.load(f)
+            save_dir = config.get("save_dir", dirpath)
+            self.start(save_dir, config, start_time=os.path.getmtime(path))
+            with self.conn:
+                self.conn.execute("UPDATE runs SET status = 'unknown' "
+                                  "WHERE save_dir = ?", (save_dir,))
@@ -0,0 +1,187 @@
+import os
+import glob
+import fcntl
+import shutil
+import argparse
+import threading
+
+import utils
+import storage
+
+#==============================================================================
+# Background mirroring of a run directory on fast local scratch to the
+# durable (networked) base_dir.
+#==============================================================================
+
+class ScratchSyncer:
+    """
+    Copies every file under scratch_dir that is new or changed since the last
+    pass to the same place under durable_dir, every `interval` seconds from a
+    background thread. Files are copied to a temporary name and renamed, so
+    durable_dir never holds half written files.
+
+    What has been copied (mtime and size of every file) is kept in a state
+    file in scratch_dir. Creating a syncer for the same directories after a
+    crash therefore only copies what had not been copied yet; recover() does
+    that for every run under a scratch dir whose final sync never happened.
+    A syncer holds a lock on scratch_dir while it is alive, so recover()
+    leaves runs that are still going alone.
+
+        syncer = ScratchSyncer(scratch_run_dir, durable_run_dir)
+        syncer.attach(run)   # run.finish() now ends with a blocking sync
+    """
+    STATE_FILE = ".sync_state.json"
+    LOCK_FILE = ".sync_state.lock"
+    DONE_FILE = ".sync_done"
+
+    def __init__(self, scratch_dir, durable_dir, interval=30., start=True, block=True,
+                 link_roots=()):
+        self.scratch_dir = scratch_dir
+        self.durable_dir = durable_dir
+        self.interval = interval
+        self.link_roots = [os.path.realpath(root) for root in link_roots]
+        self.state_path = os.path.join(scratch_dir, self.STATE_FILE)
+        os.makedirs(scratch_dir, exist_ok=True)
+        self.lock_fd = os.open(os.path.join(scratch_dir, self.LOCK_FILE),
+                               os.O_CREAT | os.O_RDWR)
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        done_path = os.path.join(scratch_dir, self.DONE_FILE)
+        if os.path.exists(done_path):
+            os.remove(done_path)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            self.state = storage.load_json(self.state_path)
+        else:
+            # Also marks scratch_dir as a directory recover() has to look at.
+            storage.save_json(self.state, self.state_path)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        if start:
+            self.thread = threading.Thread(target=self._worker, daemon=True)
+            self.thread.start()
+
+    def _worker(self):
+        while not self.stopped.wait(self.interval):
+            self.sync_once()
+
+    def changed_files(self):
+        for dirpath, _, filenames in os.walk(self.scratch_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rel = os.path.relpath(path, self.scratch_dir)
+                if rel in (self.STATE_FILE, self.LOCK_FILE, self.DONE_FILE) \
+                        or ".tmp-" in filename:
+                    continue
+                try:
+                    stat = os.lstat(path)
+                except FileNotFoundError:
+                    continue
+                stamp = [stat.st_mtime_ns, stat.st_size]
+                if self.state.get(rel) != stamp:
+                    yield rel, stamp
+
+    def sync_once(self):
+        """Copy everything that changed since the last pass. Returns the count."""
+        with self.lock:
+            copied = 0
+            for rel, stamp in list(self.changed_files()):
+                dst = os.path.join(self.durable_dir, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                tmp = dst + ".tmp-sync"
+                if os.path.lexists(tmp):
+                    os.remove(tmp)
+                src = os.path.join(self.scratch_dir, rel)
+                try:
+                    shutil.copy2(src, tmp, follow_symlinks=not self.is_kept_link(src))
+                except FileNotFoundError:
+                    continue
+                os.replace(tmp, dst)
+                self.state[rel] = stamp
+                copied += 1
+            if copied > 0:
+                storage.save_json(self.state, self.state_path)
+            return copied
+
+    def is_kept_link(self, path):
+        """
+        Whether path is a symlink into one of link_roots (e.g. a blob of the
+        BlobStore on durable storage). Those are copied as links; following
+        them would put a full copy of every blob into durable_dir.
+        """
+        if len(self.link_roots) == 0 or not os.path.islink(path):
+            return False
+        target = os.path.realpath(path)
+        return any(os.path.commonpath([target, root]) == root for root in self.link_roots)
+
+    def close(self):
+        """Stop the background thread and do a final, blocking sync."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.lock_fd is None:
+            return 0
+        copied = self.sync_once()
+        open(os.path.join(self.scratch_dir, self.DONE_FILE), 'w').close()
+        os.close(self.lock_fd)
+        self.lock_fd = None
+        return copied
+
+    def attach(self, run):
+        """Make run.finish() end with a final sync (after wandb has written)."""
+        run_finish = run.finish
+        def finish(*args, **kwargs):
+            result = run_finish(*args, **kwargs)
+            copied = self.close()
+            print(utils.colorize("Synced %d files to %s" % (copied, self.durable_dir),
+                  color="green", bold=True))
+            return result
+        run.finish = finish
+        return self
+
+# Where main() puts the directories it syncs, relative to the scratch mirror
+# of base_dir: wandb's run dirs, or base_dir/runs/<name>_<id> with --async_init.
+SYNC_ROOTS = ["wandb/*", "runs/*"]
+
+def recover(scratch_root, durable_root, patterns=SYNC_ROOTS):
+    """
+    Finish the sync of every run under the scratch mirror of durable_root
+    that was left behind by a crashed or killed job, i.e. has a state file
+    but no final sync and no live syncer. Returns {scratch dir: files copied}.
+    """
+    mirror = scratch_path(scratch_root, durable_root)
+    recovered = {}
+    for pattern in patterns:
+        for state in glob.glob(os.path.join(mirror, pattern, ScratchSyncer.STATE_FILE)):
+            run_dir = os.path.dirname(state)
+            if os.path.exists(os.path.join(run_dir, ScratchSyncer.DONE_FILE)):
+                continue
+            try:
+                syncer = ScratchSyncer(run_dir, durable_path(scratch_root, durable_root, run_dir),
+                                       start=False, block=False)
+            except BlockingIOError:
+                # Still being synced by a running job.
+                continue
+            recovered[run_dir] = syncer.close()
+            print(utils.colorize("Recovered %d files of %s" % (recovered[run_dir], run_dir),
+                  color="yellow", bold=True))
+    return recovered
+
+def scratch_path(scratch_root, durable_path):
+    """Location on scratch that mirrors durable_path."""
+    return os.path.join(os.path.expandvars(scratch_root),
+                        os.path.abspath(durable_path).lstrip(os.sep))
+
+def durable_path(scratch_root, durable_root, path):
+    """Inverse of scratch_path for a path under the scratch mirror of durable_root."""
+    mirror = scratch_path(scratch_root, durable_root)
+    return os.path.join(durable_root, os.path.relpath(path, mirror))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Copy what crashed runs left "
+                                     "on scratch to their durable directory.")
+    parser.add_argument("--scratch_dir", "-sd", type=str, required=True)
+    parser.add_argument("--base_dir", "-bd", type=str, required=True,
+        help="Durable directory the runs belong to (main()'s base_dir).")
+    args = parser.parse_args()
+    recover(args.scratch_dir, args.base_dir)
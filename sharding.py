@@ -0,0 +1,123 @@
+import os
+import heapq
+import shlex
+
+import utils
+
+#==============================================================================
+# Splitting a sweep across the tasks of a job array without a coordinator.
+#==============================================================================
+
+def shard_from_env(environ=None):
+    """
+    Return (shard_index, num_shards) of this task of a SLURM or SGE job
+    array, or None if we are not running inside one.
+    """
+    env = os.environ if environ is None else environ
+    if "SLURM_ARRAY_TASK_ID" in env:
+        # --array=0-10:2 gives ids 0, 2, ..., 10. Lists of ids (--array=1,5,9)
+        # cannot be mapped to shards reliably and are rejected.
+        task = int(env["SLURM_ARRAY_TASK_ID"])
+        first = int(env.get("SLURM_ARRAY_TASK_MIN", 0))
+        last = int(env.get("SLURM_ARRAY_TASK_MAX", task))
+        step = int(env.get("SLURM_ARRAY_TASK_STEP", 1))
+        count = int(env.get("SLURM_ARRAY_TASK_COUNT", (last - first) // step + 1))
+        if (last - first) % step != 0 or (last - first) // step + 1 != count \
+                or (task - first) % step != 0:
+            raise ValueError("SLURM array ids %d-%d (step %d, %d tasks) are not an "
+                             "evenly spaced range; pass --shard_index and "
+                             "--num_shards instead" % (first, last, step, count))
+        return (task - first) // step, count
+    if env.get("SGE_TASK_ID", "undefined") != "undefined":
+        first, last = int(env["SGE_TASK_FIRST"]), int(env["SGE_TASK_LAST"])
+        step = int(env.get("SGE_TASK_STEPSIZE", 1))
+        return (int(env["SGE_TASK_ID"]) - first) // step, (last - first) // step + 1
+    return None
+
+def shard_indices(size, shard_index, num_shards):
+    """Round robin assignment: shard k gets indices k, k + n, k + 2n, ..."""
+    if not 0 <= shard_index < num_shards:
+        raise ValueError("shard_index must be in [0, num_shards)")
+    return range(shard_index, size, num_shards)
+
+def balanced_shards(costs, num_shards):
+    """
+    Split indices 0..len(costs)-1 into num_shards lists of roughly equal
+    total cost (longest processing time first). Ties are broken by index so
+    every task computes the same assignment on its own.
+    """
+    order = sorted(range(len(costs)), key=lambda i: (-costs[i], i))
+    heap = [(0., k) for k in range(num_shards)]
+    shards = [[] for _ in range(num_shards)]
+    for i in order:
+        load, k = heapq.heappop(heap)
+        shards[k].append(i)
+        heapq.heappush(heap, (load + costs[i], k))
+    return [sorted(shard) for shard in shards]
+
+def sweep_costs(sweep, cost_key):
+    """Estimated cost of every config: the value of cost_key (e.g. timesteps)."""
+    defaults = utils.get_parser_index(sweep.parser).defaults if sweep.parser else {}
+    return [float(config.get(cost_key, defaults.get(cost_key, 1)))
+            for config in sweep]
+
+def select_shard(sweep, shard_index, num_shards, cost_key=None):
+    """
+    Indices of the configs of sweep that belong to shard_index. Plain lists
+    of arguments are always split round robin.
+    """
+    if cost_key is None or isinstance(sweep, list):
+        return shard_indices(len(sweep), shard_index, num_shards)
+    return balanced_shards(sweep_costs(sweep, cost_key), num_shards)[shard_index]
+
+def simulate_shards(sweep, num_shards, cost_key=None):
+    """
+    Compute the assignment of every shard in this process, as the tasks of
+    the array would, and check that the shards cover the sweep exactly once.
+    Returns the list of shards and their total cost.
+    """
+    shards = [list(select_shard(sweep, k, num_shards, cost_key))
+              for k in range(num_shards)]
+    assigned = sorted(i for shard in shards for i in shard)
+    if assigned != list(range(len(sweep))):
+        raise AssertionError("Shards do not cover the sweep exactly once")
+    if cost_key is None or isinstance(sweep, list):
+        costs = [1.]*len(sweep)
+    else:
+        costs = sweep_costs(sweep, cost_key)
+    return shards, [sum(costs[i] for i in shard) for shard in shards]
+
+def run_shard(sweep, shard_index, num_shards, base_args=[], cost_key=None,
+              num_workers=1, cores_per_run=None):
+    """Run this task's share of sweep locally and return the save_dirs."""
+    import launcher
+    indices = select_shard(sweep, shard_index, num_shards, cost_key)
+    print(utils.colorize("Shard %d/%d: running %d of %d configs"
+          % (shard_index, num_shards, len(indices), len(sweep)),
+          color="green", bold=True))
+    jobs = [list(base_args) + job_args(sweep, i) for i in indices]
+    return launcher.launch(jobs, num_workers, cores_per_run=cores_per_run)
+
+def job_args(sweep, i):
+    from sweep import Sweep
+    if isinstance(sweep, Sweep):
+        return sweep.raw_args(i)
+    # A plain list of argument lists/strings from a sweep file.
+    return shlex.split(sweep[i]) if isinstance(sweep[i], str) else list(sweep[i])
+
+def strip_options(raw_args, dests, parser):
+    """Remove the options of dests (and their values) from raw_args."""
+    actions = utils.get_parser_index(parser).actions
+    options = {o: actions[d] for d in dests for o in actions[d].option_strings}
+    stripped, skip = [], 0
+    for arg in raw_args:
+        if skip > 0:
+            skip -= 1
+            continue
+        name = arg.split('=', 1)[0]
+        if name in options:
+            if '=' not in arg and options[name].nargs != 0:
+                skip = 1
+            continue
+        stripped.append(arg)
+    return stripped
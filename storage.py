@@ -0,0 +1,176 @@
+import os
+import re
+import gzip
+import json
+import uuid
+import pickle
+import shutil
+import contextlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#==============================================================================
+# Persistence of result dictionaries.
+#==============================================================================
+
+# numpy is imported inside the functions that need it so that importing this
+# module (through utils) stays cheap.
+
+ARRAY_KEY = "__ndarray__"
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb', compress=False):
+    """
+    Open a temporary file next to path and move it over path once the block
+    exits without an error, so readers never see a partially written file.
+    """
+    tmp = "%s.tmp-%s" % (path, uuid.uuid4().hex[:8])
+    try:
+        if compress:
+            f = gzip.open(tmp, mode, compresslevel=1)
+        else:
+            f = open(tmp, mode)
+        with f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def has_non_finite(obj):
+    """Whether obj contains a nan or infinite float anywhere."""
+    if isinstance(obj, float):
+        return obj != obj or obj in (float('inf'), float('-inf'))
+    if isinstance(obj, dict):
+        return any(has_non_finite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_non_finite(v) for v in obj)
+    return False
+
+def dumps_json(obj, sort_keys=True):
+    """
+    Encode obj as compact json bytes, using orjson when it is installed.
+    Values json cannot represent (e.g. numpy arrays, use save_dict for those)
+    raise TypeError instead of being written as their repr. nan and inf are
+    written as NaN and Infinity like json does (orjson would write null).
+    """
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        try:
+            encoded = orjson.dumps(obj, option=option|orjson.OPT_NON_STR_KEYS)
+            # Only walk obj when orjson may have turned a float into null.
+            if b"null" not in encoded or not has_non_finite(obj):
+                return encoded
+        except TypeError:
+            # Let json raise (or handle what orjson is stricter about).
+            pass
+    return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+def loads_json(data):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN and Infinity, which json writes and reads.
+            pass
+    return json.loads(data)
+
+def is_compressed(path):
+    return path.endswith(".gz")
+
+def save_json(obj, path):
+    with atomic_write(path, 'wb', compress=is_compressed(path)) as f:
+        f.write(dumps_json(obj))
+
+def load_json(path):
+    opener = gzip.open if is_compressed(path) else open
+    with opener(path, 'rb') as f:
+        return loads_json(f.read())
+
+def save_pickle(obj, path):
+    with atomic_write(path, 'wb', compress=is_compressed(path)) as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_pickle(path):
+    opener = gzip.open if is_compressed(path) else open
+    with opener(path, 'rb') as f:
+        return pickle.load(f)
+
+#==============================================================================
+# Dictionaries with numpy arrays.
+#==============================================================================
+
+def save_dict(dic, path, compress=False):
+    """
+    Save a (nested) dictionary to path as json. numpy arrays are not encoded
+    in the json but written to .npy files in a directory next to it and
+    referenced from the json, so load_dict can memory map them.
+
+    With compress=True the json is gzipped and arrays go to compressed .npz
+    files instead (smaller, but they cannot be memory mapped).
+    """
+    import numpy as np
+
+    if compress and not is_compressed(path):
+        path = path + ".gz"
+    token = uuid.uuid4().hex[:8]
+    arrays_dir = "%s.arrays-%s" % (path, token)
+    counter = [0]
+
+    def encode(obj, keypath):
+        if isinstance(obj, dict):
+            return {k: encode(v, keypath + [str(k)]) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [encode(v, keypath + [str(i)]) for i, v in enumerate(obj)]
+        if isinstance(obj, np.ndarray) and obj.dtype != object:
+            os.makedirs(arrays_dir, exist_ok=True)
+            name = "%d_%s" % (counter[0], re.sub(r'[^\w.-]', '_', '.'.join(keypath))[:100])
+            counter[0] += 1
+            if compress:
+                name += ".npz"
+                np.savez_compressed(os.path.join(arrays_dir, name), array=obj)
+            else:
+                name += ".npy"
+                np.save(os.path.join(arrays_dir, name), obj, allow_pickle=False)
+            return {ARRAY_KEY: os.path.join(os.path.basename(arrays_dir), name)}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return obj
+
+    encoded = encode(dic, [])
+    save_json(encoded, path)
+
+    # Only remove older array directories once the new json is in place.
+    prefix = os.path.basename(path) + ".arrays-"
+    dirname = os.path.dirname(path) or '.'
+    for entry in os.listdir(dirname):
+        if entry.startswith(prefix) and entry != os.path.basename(arrays_dir):
+            shutil.rmtree(os.path.join(dirname, entry), ignore_errors=True)
+    return path
+
+def load_dict(path, mmap=True):
+    """Load a dictionary saved with save_dict. Arrays are memory mapped if mmap."""
+    import numpy as np
+
+    if not os.path.exists(path) and os.path.exists(path + ".gz"):
+        path = path + ".gz"
+    dirname = os.path.dirname(path)
+
+    def decode(obj):
+        if isinstance(obj, dict):
+            if len(obj) == 1 and ARRAY_KEY in obj:
+                array_path = os.path.join(dirname, obj[ARRAY_KEY])
+                if array_path.endswith(".npz"):
+                    with np.load(array_path) as data:
+                        return data["array"]
+                return np.load(array_path, mmap_mode='r' if mmap else None,
+                               allow_pickle=False)
+            return {k: decode(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [decode(v) for v in obj]
+        return obj
+
+    return decode(load_json(path))
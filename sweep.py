@@ -0,0 +1,141 @@
+import math
+import random
+
+import utils
+
+#==============================================================================
+# Lazily expanded hyperparameter sweeps.
+#==============================================================================
+
+class Sweep:
+    """
+    A sweep over the arguments of a parser, described by a dictionary:
+
+        {
+            # Cartesian product of these lists.
+            "grid": {"int_arg": [1, 2, 3], "mlp_layers": [[64, 64], [256]]},
+            # Lists of equal length that are walked together.
+            "zip": {"float_arg": [0.1, 0.2], "group": ["a", "b"]},
+            # Sampled num_samples times for every grid/zip point.
+            "random": {"float_arg_with_none_as_default":
+                           {"dist": "log_uniform", "low": 1e-4, "high": 1e-1}},
+            "num_samples": 4,
+            # Same for every config.
+            "fixed": {"project": "my_sweep"},
+            # Seed of the random draws.
+            "seed": 0,
+        }
+
+    Every section is optional. Configs are never materialized: sweep[i]
+    computes config i directly from i (random values are drawn from a
+    generator seeded with (seed, i)), so any config of an arbitrarily large
+    sweep costs O(number of keys) and iterating is a lazy generator.
+
+    Distributions for "random": uniform, log_uniform (low, high), int_uniform
+    (low, high, both inclusive), normal (mean, std) and choice (values).
+    """
+    def __init__(self, spec, parser=None):
+        self.grid = list(spec.get("grid", {}).items())
+        self.zip = list(spec.get("zip", {}).items())
+        self.random = sorted(spec.get("random", {}).items())
+        self.num_samples = spec.get("num_samples", 1) if self.random else 1
+        self.fixed = dict(spec.get("fixed", {}))
+        self.seed = spec.get("seed", 0)
+        self.parser = parser
+
+        zip_lens = {len(values) for _, values in self.zip}
+        if len(zip_lens) > 1:
+            raise ValueError("All lists in zip must have the same length")
+        self.zip_len = zip_lens.pop() if zip_lens else 1
+        self.grid_lens = [len(values) for _, values in self.grid]
+        self.size = math.prod(self.grid_lens) * self.zip_len * self.num_samples
+
+        for _, dist in self.random:
+            if dist["dist"] not in SAMPLERS:
+                raise ValueError("Unknown distribution %s" % dist["dist"])
+        if parser is not None:
+            index = utils.get_parser_index(parser)
+            for key in self.keys():
+                if key not in index.defaults:
+                    raise ValueError("%s is not an argument of the parser" % key)
+
+    def keys(self):
+        return ([k for k, _ in self.grid] + [k for k, _ in self.zip] +
+                [k for k, _ in self.random] + list(self.fixed))
+
+    def values(self, key):
+        """All values key can take, or None if it is sampled."""
+        for k, values in self.grid + self.zip:
+            if k == key:
+                return list(values)
+        if key in self.fixed:
+            return [self.fixed[key]]
+        return None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("sweep index out of range")
+
+        config = dict(self.fixed)
+        sample, rest = i % self.num_samples, i // self.num_samples
+        zip_idx, rest = rest % self.zip_len, rest // self.zip_len
+        for k, values in self.zip:
+            config[k] = values[zip_idx]
+        # Last grid key varies fastest.
+        for (k, values), n in zip(reversed(self.grid), reversed(self.grid_lens)):
+            config[k] = values[rest % n]
+            rest //= n
+        if len(self.random) > 0:
+            rng = random.Random("%s:%d" % (self.seed, i))
+            for k, dist in self.random:
+                config[k] = SAMPLERS[dist["dist"]](rng, dist)
+        return config
+
+    def __iter__(self):
+        return self.configs()
+
+    def configs(self, start=0, stop=None, step=1):
+        stop = self.size if stop is None else min(stop, self.size)
+        for i in range(start, stop, step):
+            yield self[i]
+
+    def raw_args(self, i):
+        return config_to_raw_args(self[i], self.parser)
+
+    def iter_raw_args(self, start=0, stop=None, step=1):
+        for config in self.configs(start, stop, step):
+            yield config_to_raw_args(config, self.parser)
+
+SAMPLERS = {
+    "uniform": lambda rng, d: rng.uniform(d["low"], d["high"]),
+    "log_uniform": lambda rng, d: math.exp(rng.uniform(math.log(d["low"]),
+                                                       math.log(d["high"]))),
+    "int_uniform": lambda rng, d: rng.randint(d["low"], d["high"]),
+    "normal": lambda rng, d: rng.gauss(d["mean"], d["std"]),
+    "choice": lambda rng, d: rng.choice(d["values"]),
+}
+
+def config_to_raw_args(config, parser):
+    """Turn a config into the argument vector that would produce it."""
+    actions = utils.get_parser_index(parser).actions
+    raw_args = []
+    for key, value in config.items():
+        action = actions[key]
+        option = "--" + key if "--" + key in action.option_strings else \
+                 action.option_strings[0]
+        if action.nargs == 0:
+            # store_true / store_false: only pass the flag to flip the default.
+            if value != action.default:
+                raw_args.append(option)
+        elif value is None:
+            continue
+        elif isinstance(value, (list, tuple)):
+            raw_args += [option] + [str(v) for v in value]
+        else:
+            raw_args += [option, str(value)]
+    return raw_args
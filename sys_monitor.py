@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+#==============================================================================
+# Cheap, high rate sampling of the process' resource usage from /proc.
+#==============================================================================
+
+FIELDS = ["time", "cpu_percent", "rss_mb", "read_mb_s", "write_mb_s",
+          "ctx_switches_s"]
+
+class ProcReader:
+    """
+    Cumulative counters of a process (cpu seconds, rss, bytes read and
+    written, context switches). The /proc files are opened once and reread
+    with pread, so a sample costs a few syscalls and no allocations of file
+    objects. Counters that cannot be read (e.g. /proc/<pid>/io of another
+    user) are nan.
+    """
+    def __init__(self, pid=None):
+        pid = os.getpid() if pid is None else pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self.fds = {}
+        for name in ["stat", "statm", "io", "status"]:
+            try:
+                self.fds[name] = os.open("/proc/%d/%s" % (pid, name), os.O_RDONLY)
+            except OSError:
+                self.fds[name] = None
+
+    def read(self, name):
+        fd = self.fds[name]
+        return None if fd is None else os.pread(fd, 8192, 0)
+
+    def counters(self):
+        """(cpu seconds, rss bytes, read bytes, written bytes, context switches)"""
+        # Fields after the command name, which may itself contain spaces.
+        stat = self.read("stat").rsplit(b')', 1)[1].split()
+        cpu = (int(stat[11]) + int(stat[12])) / self.ticks
+        rss = int(self.read("statm").split()[1]) * self.page_size
+        read_bytes = write_bytes = ctx = float('nan')
+        io = self.read("io")
+        if io is not None:
+            for line in io.splitlines():
+                if line.startswith(b"read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    write_bytes = int(line.split()[1])
+        status = self.read("status")
+        if status is not None:
+            ctx = 0
+            for line in status.splitlines():
+                if line.endswith(b"ctxt_switches", 0, line.find(b':')):
+                    ctx += int(line.split()[1])
+        return cpu, rss, read_bytes, write_bytes, ctx
+
+    def close(self):
+        for fd in self.fds.values():
+            if fd is not None:
+                os.close(fd)
+
+class SystemMonitor:
+    """
+    Samples cpu usage, rss, disk I/O and context switches of this process
+    every `interval` seconds from a background thread into a fixed size
+    numpy ring buffer (one row per sample, columns FIELDS). Every
+    `summary_interval` seconds only percentiles and peaks of the samples
+    since the previous summary are logged to the run, e.g. sys/rss_mb/max.
+    They are logged with commit=False so that they are attached to the next
+    step the training loop logs instead of advancing the step themselves.
+
+        monitor = SystemMonitor(run, interval=0.1)
+        monitor.attach(run, save_dir)   # run.finish() stops it and saves the buffer
+    """
+    def __init__(self, run=None, interval=0.1, summary_interval=30., capacity=None,
+                 pid=None, prefix="sys/", start=True):
+        self.run = run
+        self.interval = interval
+        self.summary_interval = summary_interval
+        self.prefix = prefix
+        # By default the buffer holds two summary intervals worth of samples.
+        if capacity is None:
+            capacity = max(16, int(np.ceil(2*summary_interval/interval)))
+        self.buffer = np.full((capacity, len(FIELDS)), np.nan)
+        self.count = 0
+        self.summarized = 0
+        self.peaks = np.full(len(FIELDS), np.nan)
+
+        self.reader = ProcReader(pid)
+        self.start_time = time.monotonic()
+        self.previous = (self.start_time, self.reader.counters())
+        self.stopped = threading.Event()
+        self.thread = None
+        if start:
+            self.thread = threading.Thread(target=self._worker, daemon=True)
+            self.thread.start()
+
+    def sample(self):
+        now, counters = time.monotonic(), self.reader.counters()
+        (then, (cpu, _, read_bytes, write_bytes, ctx)) = self.previous
+        self.previous = (now, counters)
+        dt = max(now - then, 1e-9)
+        row = self.buffer[self.count % len(self.buffer)]
+        row[0] = now - self.start_time
+        row[1] = 100*(counters[0] - cpu)/dt
+        row[2] = counters[1]/2**20
+        row[3] = (counters[2] - read_bytes)/dt/2**20
+        row[4] = (counters[3] - write_bytes)/dt/2**20
+        row[5] = (counters[4] - ctx)/dt
+        np.fmax(self.peaks, row, out=self.peaks)
+        self.count += 1
+
+    def _worker(self):
+        last_summary = time.monotonic()
+        while not self.stopped.wait(self.interval):
+            self.sample()
+            if time.monotonic() - last_summary >= self.summary_interval:
+                self.emit()
+                last_summary = time.monotonic()
+
+    def recent(self, n=None):
+        """The last n (default: all buffered) samples, oldest first."""
+        available = min(self.count, len(self.buffer))
+        n = available if n is None else min(n, available)
+        indices = np.arange(self.count - n, self.count) % len(self.buffer)
+        return self.buffer[indices]
+
+    def summary(self):
+        """Percentiles and peaks of the samples since the previous summary."""
+        samples = self.recent(self.count - self.summarized)
+        self.summarized = self.count
+        if len(samples) == 0:
+            return {}
+        stats = {"p50": np.nanpercentile(samples, 50, axis=0),
+                 "p95": np.nanpercentile(samples, 95, axis=0),
+                 "max": np.nanmax(samples, axis=0)}
+        return {"%s%s/%s" % (self.prefix, field, stat): float(values[i])
+                for stat, values in stats.items()
+                for i, field in enumerate(FIELDS) if i > 0 and np.isfinite(values[i])}
+
+    def emit(self):
+        summary = self.summary()
+        if self.run is not None and len(summary) > 0:
+            self.run.log(summary, commit=False)
+        return summary
+
+    def close(self, save_dir=None):
+        """
+        Stop sampling, log the last summary and put the peaks over the whole
+        run into the run summary. With save_dir the buffered samples are
+        saved to save_dir/system_metrics.npy as a record array.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.sample()
+        self.reader.close()
+        self.emit()
+        peaks = {"%s%s/peak" % (self.prefix, field): float(self.peaks[i])
+                 for i, field in enumerate(FIELDS) if i > 0 and np.isfinite(self.peaks[i])}
+        if self.run is not None:
+            self.run.summary.update(peaks)
+        if save_dir is not None:
+            samples = self.recent()
+            np.save(os.path.join(save_dir, "system_metrics.npy"),
+                    np.rec.fromarrays(samples.T, names=FIELDS), allow_pickle=False)
+        return peaks
+
+    def attach(self, run, save_dir=None):
+        """Make run.finish() stop the monitor first."""
+        run_finish = run.finish
+        def finish(*args, **kwargs):
+            self.close(save_dir)
+            return run_finish(*args, **kwargs)
+        run.finish = finish
+        return self
@@ -1,6 +1,11 @@
 import math
-import json
 import os
+import time
+import shutil
+import argparse
+import functools
+
+import storage
 
 #==============================================================================
 # Functions to handle parser.
@@ -58,57 +63,45 @@ def concat_nondefault_arguments(parser, ignore_keys=[], path_keys=[],
     If the actual_config dictionary is specified then the values in it are preferred
     over the values passed through command line.
     """
-    sl_map = get_sl_map(parser)
-
-    def get_default(key):
-        if default_config is not None and key in default_config:
-            return default_config[key]
-        return parser.get_default(key)
+    index = get_parser_index(parser)
+    if actual_config is None:
+        actual_config = vars(parser.parse_args())
+    return concat_config(actual_config, get_defaults(index, default_config),
+                         index.sl_map, ignore_keys, path_keys)
 
-    # Determine save dir based on non-default arguments if no
-    # save_dir is provided.
+def concat_config(config, defaults, sl_map, ignore_keys=[], path_keys=[]):
+    """
+    Same as concat_nondefault_arguments but works purely from an already
+    resolved config: every key in defaults whose value in config differs from
+    the default is added to the name. Nothing is parsed here.
+    """
     concat = ''
-    for key, value in sorted(vars(parser.parse_args()).items()):
-        if actual_config is not None:
-            value = actual_config[key]
-
+    for key in sorted(defaults):
         # Skip these arguments.
         if key in ignore_keys:
             continue
 
+        value, default = config[key], defaults[key]
         if type(value) == list:
             b = False
-            if get_default(key) is None or len(value) != len(get_default(key)):
+            if default is None or len(value) != len(default):
                 b = True
             else:
-                for v, p in zip(value, get_default(key)):
+                for v, p in zip(value, default):
                     if v != p:
                         b = True
                         break
             if b:
                 concat += '%s_' % sl_map[key]
                 for v in value:
-                    if type(v) not in [bool, int] and hasattr(v, "__float__"):
-                        if v == 0:
-                            valstr = 0
-                        else:
-                            valstr = round(v, 4-int(math.floor(math.log10(abs(v))))-1)
-                    else: valstr = v
-                    concat += '%s_' % str(valstr)
+                    concat += '%s_' % str(format_value(v))
 
         # Add key, value to concat.
-        elif value != get_default(key):
+        elif value != default:
             # For paths.
             if value is not None and key in path_keys:
                 value = value.split('/')[-1]
-
-            if type(value) not in [bool, int] and hasattr(value, "__float__"):
-                if value == 0:
-                    valstr = 0
-                else:
-                    valstr = round(value, 4-int(math.floor(math.log10(abs(value))))-1)
-            else: valstr = value
-            concat += '%s_%s_' % (sl_map[key], valstr)
+            concat += '%s_%s_' % (sl_map[key], format_value(value))
 
     if len(concat) > 0:
         # Remove extra underscore at the end.
@@ -116,6 +109,29 @@ def concat_nondefault_arguments(parser, ignore_keys=[], path_keys=[],
 
     return concat
 
+def format_value(value):
+    """Round floats to 4 significant figures, leave everything else as is."""
+    if type(value) not in [bool, int] and hasattr(value, "__float__"):
+        return round_sig(value)
+    return value
+
+@functools.lru_cache(maxsize=1<<16)
+def round_sig(value):
+    if value == 0:
+        return 0
+    return round(value, 4-int(math.floor(math.log10(abs(value))))-1)
+
+def get_defaults(index, default_config=None):
+    """
+    Defaults used for naming: values in default_config take precedence over
+    the parser defaults.
+    """
+    if default_config is None or len(default_config) == 0:
+        return index.defaults
+    return {key: convert_config_value(index.actions[key], default_config[key])
+                 if key in default_config else default
+            for key, default in index.defaults.items()}
+
 def get_sl_map(parser):
     """Return a dictionary containing short-long name mapping in parser."""
     sl_map = {}
@@ -160,26 +176,20 @@ def merge_configs(config, parser, parser_dict, sys_argv):
     config_keys = list(config.keys())
     parser_keys = list(parser_dict.keys())
 
-    sl_map = get_sl_map(parser)
-    rev_sl_map = reverse_dict(sl_map)
-    def other_name(key):
-        if key in sl_map:
-            return sl_map[key]
-        elif key in rev_sl_map:
-            return rev_sl_map[key]
-        else:
-            return key
+    index = get_parser_index(parser)
+    specified = index.specified_keys(sys_argv)
 
     merged_config = {}
     for key in config_keys + parser_keys:
-        if key in parser_keys:
+        if key in parser_dict:
             # Was argument supplied through command line?
-            if key_was_specified(key, other_name(key), sys_argv):
+            if key in specified:
                 merged_config[key] = parser_dict[key]
             else:
                 # If key is in config, then use value from there.
                 if key in config:
-                    merged_config[key] = config[key]
+                    merged_config[key] = convert_config_value(index.actions[key],
+                                                              config[key])
                 else:
                     merged_config[key] = parser_dict[key]
         elif key in config:
@@ -188,305 +198,344 @@ def merge_configs(config, parser, parser_dict, sys_argv):
 
     return merged_config
 
+def convert_config_value(action, value):
+    """
+    Apply the type of a parser argument to a value from a config file, which
+    argparse never sees. E.g. yaml reads 1e-3 as the string "1e-3".
+    """
+    if action.type is None or action.type is str:
+        return value
+    def convert(v):
+        if not isinstance(v, str):
+            return v
+        try:
+            return action.type(v)
+        except (TypeError, ValueError):
+            raise ValueError("Config value %r of %s is not a valid %s"
+                             % (v, action.dest, getattr(action.type, "__name__", action.type)))
+    if isinstance(value, (list, tuple)):
+        return type(value)(convert(v) for v in value)
+    return convert(value)
+
+class ParserIndex:
+    """
+    Name mappings and defaults of a parser, computed once. Use
+    get_parser_index(parser) rather than building one directly so that the
+    index is shared by every call made with the same parser.
+    """
+    def __init__(self, parser):
+        self.num_actions = len(parser._actions)
+        self.actions = {action.dest: action for action in parser._actions}
+        self.sl_map = get_sl_map(parser)
+        self.ls_map = reverse_dict(self.sl_map)
+
+        # Same keys and values as vars(parser.parse_args([])) would give
+        # before type conversion i.e. what parser.get_default returns.
+        self.defaults = dict(parser._defaults)
+        for action in parser._actions:
+            if action.dest is not argparse.SUPPRESS and \
+               action.default is not argparse.SUPPRESS:
+                self.defaults[action.dest] = action.default
+
+    def other_name(self, key):
+        if key in self.sl_map:
+            return self.sl_map[key]
+        elif key in self.ls_map:
+            return self.ls_map[key]
+        else:
+            return key
+
+    def specified_keys(self, sys_argv):
+        """
+        Return the set of argument names (both short and long) that appear
+        in sys_argv, found in a single pass over it.
+        """
+        specified = set()
+        for arg in sys_argv:
+            if len(arg) > 1 and arg[0] == '-':
+                key = arg.split('=', 1)[0].strip('-')
+                specified.add(key)
+                specified.add(self.other_name(key))
+        return specified
+
+def get_parser_index(parser):
+    """Return the ParserIndex of parser, building it on first use."""
+    index = getattr(parser, "_utils_index", None)
+    if index is None or index.num_actions != len(parser._actions):
+        index = ParserIndex(parser)
+        parser._utils_index = index
+    return index
+
 def key_was_specified(key1, key2, sys_argv):
     for arg in sys_argv:
         if arg[0] == '-' and (key1 == arg.strip('-') or key2 == arg.strip('-')):
             return True
     return False
 
+# Arguments that turn main() into a sweep launcher; stripped from the
+# arguments passed on to every run.
+SWEEP_KEYS = ["sweep_file", "shard_index", "num_shards", "shard_cost_key",
+              "num_workers", "cores_per_run"]
+# Keys that only control how main() runs and never change the result. They
+# are left out of both the run name and the config hash (run_cache), so a
+# new control argument only has to be added here.
+CONTROL_KEYS = SWEEP_KEYS + ["validate_only", "skip_completed", "cache_ignore_keys",
+                "log_window", "log_interval", "log_timings", "profile_setup",
+                "async_init", "scratch_dir", "sync_interval", "resume",
+                "monitor_interval", "monitor_summary_interval",
+                "asha_min_resource", "asha_reduction_factor", "asha_mode",
+                "asha_experiment", "placement"]
+# TODO: Add keys you want to not be included in the name here
+# (seed is left out because it is appended to every name anyway)
+NAME_IGNORE_KEYS = ["config_file", "project", "group", "seed"] + CONTROL_KEYS
+# TODO: Add keys you want to be treated as paths here
+# This avoids including the entire path in the name
+# instead only the last part of the path is included
+NAME_PATH_KEYS = ["expert_path"]
+
 def get_name(parser, default_config, actual_config, mod_name):
     """Returns a name for the experiment based on parameters passed."""
-    prefix = lambda x, y: x + '_'*(len(y)>0) + y
-
-    name = actual_config["name"]
-    if name is None:
-        name = concat_nondefault_arguments(
-                parser,
-                # TODO: Add keys you want to not be included in the name here
-                ignore_keys=["config_file", "project", "group"],
-                # TODO: Add keys you want to be treated as paths here
-                # This avoids including the entire path in the name
-                # instead only the last part of the path is included
-                path_keys=["expert_path"],
-                default_config=default_config,
-                actual_config=actual_config
-        )
-        if len(mod_name) > 0:
-            name = prefix(mod_name.split('.')[-1], name)
-
-        # TODO: if you want some key to be the one that occurs
-        # first in the name, add it here
-        # For example, putting env_id in RL Experiments here
-        # generally works for me. 
-        # And makes browsing experiments on wandb easier.
-        name = prefix(actual_config["project"], name)
-
-    # Append seed and system id regardless of whether the name was passed in
-    # or not
-    #if "wandb_sweep" in actual_config and not actual_config["wandb_sweep"]:
-    #    sid = get_sid()
-    #else:
-    #    sid = "-1"
-    name = name + "_s_" + str(actual_config["seed"]) #+ "_sid_" + sid
-
-    return name
+    return get_names(parser, default_config, [actual_config], mod_name)[0]
 
-color2num = dict(
-    gray=30,
-    red=31,
-    green=32,
-    yellow=33,
-    blue=34,
-    magenta=35,
-    cyan=36,
-    white=37,
-    crimson=38
-)
-
-def colorize(string, color, bold=False, highlight=False):
-    attr = []
-    num = color2num[color]
-    if highlight: num += 10
-    attr.append(str(num))
-    if bold: attr.append('1')
-    return '\x1b[%sm%s\x1b[0m' % (';'.join(attr), string)
-
-def concat_nondefault_arguments(parser, ignore_keys=[], path_keys=[],
-                                default_config=None, actual_config=None):
+def get_names(parser, default_config, configs, mod_name):
     """
-    Given an instance of argparse.ArgumentParser, return a concatenation
-    of the names and values of only those arguments that do not have the
-    default value (i.e. alternative values were specified via command line).
-
-    So if you run
-
-        python file.py -abc 123 -def 456
-
-    this function will return abc_123_def_456. (In case the value passed for
-    'abc' or 'def' is the same as the default value, they will be ignored)
-
-    If a shorter version of the argument name is specified, it will be
-    preferred over the longer version.
-
-    Arguments are sorted alphabetically.
-
-    If you want this function to ignore some arguments, you can pass them
-    as a list to the ignore_keys argument.
-
-    If some arguments expect paths, you can pass in those as a list to the
-    path_keys argument. The values of these will be split at '/' and only the
-    last substring will be used.
-
-    If the default config dictionary is specified then the default values in it
-    are preferred ovr the default values in parser.
-
-    If the actual_config dictionary is specified then the values in it are preferred
-    over the values passed through command line.
+    Returns the names of a batch of already resolved configs. Only the
+    configs and the defaults are looked at (sys.argv is never parsed), so a
+    sweep driver can name any number of runs in one call.
     """
-    sl_map = get_sl_map(parser)
-
-    def get_default(key):
-        if default_config is not None and key in default_config:
-            return default_config[key]
-        return parser.get_default(key)
-
-    # Determine save dir based on non-default arguments if no
-    # save_dir is provided.
-    concat = ''
-    for key, value in sorted(vars(parser.parse_args()).items()):
-        if actual_config is not None:
-            value = actual_config[key]
-
-        # Skip these arguments.
-        if key in ignore_keys:
-            continue
-
-        if type(value) == list:
-            b = False
-            if get_default(key) is None or len(value) != len(get_default(key)):
-                b = True
-            else:
-                for v, p in zip(value, get_default(key)):
-                    if v != p:
-                        b = True
-                        break
-            if b:
-                concat += '%s_' % sl_map[key]
-                for v in value:
-                    if type(v) not in [bool, int] and hasattr(v, "__float__"):
-                        if v == 0:
-                            valstr = 0
-                        else:
-                            valstr = round(v, 4-int(math.floor(math.log10(abs(v))))-1)
-                    else: valstr = v
-                    concat += '%s_' % str(valstr)
-
-        # Add key, value to concat.
-        elif value != get_default(key):
-            # For paths.
-            if value is not None and key in path_keys:
-                value = value.split('/')[-1]
-
-            if type(value) not in [bool, int] and hasattr(value, "__float__"):
-                if value == 0:
-                    valstr = 0
-                else:
-                    valstr = round(value, 4-int(math.floor(math.log10(abs(value))))-1)
-            else: valstr = value
-            concat += '%s_%s_' % (sl_map[key], valstr)
-
-    if len(concat) > 0:
-        # Remove extra underscore at the end.
-        concat = concat[:-1]
-
-    return concat
-
-def get_sl_map(parser):
-    """Return a dictionary containing short-long name mapping in parser."""
-    sl_map = {}
+    prefix = lambda x, y: x + '_'*(len(y)>0) + y
 
-    # Add arguments with long names defined.
-    for key in parser._option_string_actions.keys():
-        if key[1] == '-':
-            options = parser._option_string_actions[key].option_strings
-            if len(options) == 1:   # No short argument.
-                sl_map[key[2:]] = key[2:]
-            else:
-                if options[0][1] == '-':
-                    sl_map[key[2:]] = options[1][1:]
-                else:
-                    sl_map[key[2:]] = options[0][1:]
+    index = get_parser_index(parser)
+    defaults = get_defaults(index, default_config)
+
+    names = []
+    for actual_config in configs:
+        name = actual_config["name"]
+        if name is None:
+            name = concat_config(actual_config, defaults, index.sl_map,
+                                 NAME_IGNORE_KEYS, NAME_PATH_KEYS)
+            if len(mod_name) > 0:
+                name = prefix(mod_name.split('.')[-1], name)
+
+            # TODO: if you want some key to be the one that occurs
+            # first in the name, add it here
+            # For example, putting env_id in RL Experiments here
+            # generally works for me. 
+            # And makes browsing experiments on wandb easier.
+            name = prefix(actual_config["project"], name)
+
+        # Append seed and system id regardless of whether the name was passed in
+        # or not
+        #if "wandb_sweep" in actual_config and not actual_config["wandb_sweep"]:
+        #    sid = get_sid()
+        #else:
+        #    sid = "-1"
+        name = name + "_s_" + str(actual_config["seed"]) #+ "_sid_" + sid
+        names.append(name)
+
+    return names
+
+class ConfigDict(dict):
+    """
+    Dictionary with attribute access and as_dict(), i.e. the parts of the
+    wandb.config interface that the code after main()'s setup relies on. Used
+    while wandb.config is not available yet.
+    """
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
 
-    # We've now processed all arguments with long names. Now need to process
-    # those with only short names specified.
-    known_keys = list(sl_map.keys()) + list(sl_map.values())
-    for key in parser._option_string_actions.keys():
-        if key[1:] not in known_keys and key[2:] not in known_keys:
-            sl_map[key[1:]] = key[1:]
+    def __setattr__(self, key, value):
+        self[key] = value
 
-    return sl_map
+    def as_dict(self):
+        return dict(self)
 
-def reverse_dict(x):
+class FrozenConfig:
     """
-    Exchanges keys and values in x i.e. x[k] = v ---> x[v] = k.
-    Added Because reversed(x) does not work in python 3.7.
+    Base class of the snapshots made by freeze_config. Every key is a slot,
+    so reading config.float_arg is a plain attribute lookup instead of a
+    trip through wandb.config's __getattr__ and locks.
     """
-    y = {}
-    for k,v in x.items():
-        y[v] = k
-    return y
-
-def merge_configs(config, parser, parser_dict, sys_argv):
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError("FrozenConfig is read only")
+
+    def __delattr__(self, key):
+        raise AttributeError("FrozenConfig is read only")
+
+    def as_dict(self):
+        return {key: thaw(getattr(self, key)) for key in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return "FrozenConfig(%s)" % ', '.join("%s=%r" % (key, getattr(self, key))
+                                              for key in self.__slots__)
+
+    def __reduce__(self):
+        # The generated classes cannot be found by pickle; rebuild instead.
+        return freeze_config, (self.as_dict(),)
+
+def freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        import types
+        return types.MappingProxyType({k: freeze(v) for k, v in value.items()})
+    return value
+
+def thaw(value):
+    if isinstance(value, tuple):
+        return tuple(thaw(v) for v in value)
+    if type(value).__name__ == "mappingproxy":
+        return {k: thaw(v) for k, v in value.items()}
+    return value
+
+@functools.lru_cache(maxsize=None)
+def frozen_config_class(keys, types):
+    annotations = {key: t for key, t in zip(keys, types)}
+    return type("FrozenConfig", (FrozenConfig,),
+                {"__slots__": keys, "__annotations__": annotations})
+
+def freeze_config(config):
     """
-    Merge a dictionary (config) and arguments in parser. Order of priority:
-    argument supplied through command line > specified in config > default
-    values in parser.
+    Immutable snapshot of config (a dict, ConfigDict or wandb.config) with
+    one typed slot per key. Keys that are not identifiers (and wandb's
+    private keys) are left out. Lists become tuples.
     """
-    config_keys = list(config.keys())
-    parser_keys = list(parser_dict.keys())
-
-    sl_map = get_sl_map(parser)
-    rev_sl_map = reverse_dict(sl_map)
-    def other_name(key):
-        if key in sl_map:
-            return sl_map[key]
-        elif key in rev_sl_map:
-            return rev_sl_map[key]
-        else:
-            return key
-
-    merged_config = {}
-    for key in config_keys + parser_keys:
-        if key in parser_keys:
-            # Was argument supplied through command line?
-            if key_was_specified(key, other_name(key), sys_argv):
-                merged_config[key] = parser_dict[key]
-            else:
-                # If key is in config, then use value from there.
-                if key in config:
-                    merged_config[key] = config[key]
-                else:
-                    merged_config[key] = parser_dict[key]
-        elif key in config:
-            # If key was only specified in config, use value from there.
-            merged_config[key] = config[key]
+    import keyword
+    if hasattr(config, "as_dict"):
+        config = config.as_dict()
+    items = [(k, freeze(v)) for k, v in sorted(config.items())
+             if k.isidentifier() and not keyword.iskeyword(k) and not k.startswith('_')]
+    cls = frozen_config_class(tuple(k for k, _ in items),
+                              tuple(type(v) for _, v in items))
+    snapshot = object.__new__(cls)
+    for key, value in items:
+        object.__setattr__(snapshot, key, value)
+    return snapshot
 
-    return merged_config
-
-def key_was_specified(key1, key2, sys_argv):
-    for arg in sys_argv:
-        if arg[0] == '-' and (key1 == arg.strip('-') or key2 == arg.strip('-')):
-            return True
-    return False
+# =============================================================================
+# Timing
+# =============================================================================
 
-def get_name(parser, default_config, actual_config, mod_name):
-    """Returns a name for the experiment based on parameters passed."""
-    prefix = lambda x, y: x + '_'*(len(y)>0) + y
+class PhaseTimer:
+    """
+    Records how long each phase of a procedure takes. Call lap(name) at the
+    end of every phase; the time since the previous lap is attributed to it.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = {}
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.) + now - self.last
+        self.last = now
+
+    def report(self):
+        return {"phases": dict(self.phases), "total": self.last - self.start}
+
+class SetupProfiler:
+    """Opt-in cProfile and tracemalloc capture of a block of code."""
+    def __init__(self):
+        import cProfile
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        self.profile = cProfile.Profile()
+        self.running = True
+        tracemalloc.start()
+        self.profile.enable()
+
+    def stop(self, save_dir=None, top=25):
+        """
+        Stop and, with save_dir, write setup.prof and setup_memory.txt to it.
+        Returns the peak traced memory; does nothing if already stopped.
+        """
+        if not self.running:
+            return None
+        self.running = False
+        self.profile.disable()
+        snapshot = self.tracemalloc.take_snapshot()
+        _, peak = self.tracemalloc.get_traced_memory()
+        self.tracemalloc.stop()
+        if save_dir is None:
+            return peak
+
+        self.profile.dump_stats(os.path.join(save_dir, "setup.prof"))
+        with open(os.path.join(save_dir, "setup_memory.txt"), 'w') as f:
+            f.write("Peak traced memory: %.1f MB\n" % (peak/2**20))
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write("%s\n" % stat)
+        return peak
 
-    name = actual_config["name"]
-    if name is None:
-        name = concat_nondefault_arguments(
-                parser,
-                # TODO: Add keys you want to not be included in the name here
-                ignore_keys=["config_file", "project", "group"],
-                # TODO: Add keys you want to be treated as paths here
-                # This avoids including the entire path in the name
-                # instead only the last part of the path is included
-                path_keys=["expert_path"],
-                default_config=default_config,
-                actual_config=actual_config
-        )
-        if len(mod_name) > 0:
-            name = prefix(mod_name.split('.')[-1], name)
-
-        # TODO: if you want some key to be the one that occurs
-        # first in the name, add it here
-        # For example, putting env_id in RL Experiments here
-        # generally works for me. 
-        # And makes browsing experiments on wandb easier.
-        name = prefix(actual_config["project"], name)
-
-    # Append seed and system id regardless of whether the name was passed in
-    # or not
-    #if "wandb_sweep" in actual_config and not actual_config["wandb_sweep"]:
-    #    sid = get_sid()
-    #else:
-    #    sid = "-1"
-    name = name + "_s_" + str(actual_config["seed"]) #+ "_sid_" + sid
-
-    return name
 
 # =============================================================================
-# File handlers
-# =============================================================================
 
-def save_dict_as_json(dic, save_dir, name=None):
+# These are thin wrappers around storage.py: writes are atomic, json is
+# written compactly (with orjson if installed) and a path ending in .gz is
+# compressed. For large results with numpy arrays use save_results.
+
+def save_dict_as_json(dic, save_dir, name=None, store=None):
     if name is not None:
         save_dir = os.path.join(save_dir, name+".json")
-    with open(save_dir, 'w') as out:
-        out.write(json.dumps(dic, separators=(',\n','\t:\t'),
-                  sort_keys=True))
+    storage.save_json(dic, save_dir)
+    deduplicate([save_dir], store)
 
 def load_dict_from_json(load_from, name=None):
     if name is not None:
         load_from = os.path.join(load_from, name+".json")
-    with open(load_from, "rb") as f:
-        dic = json.load(f)
-
-    return dic
+    return storage.load_json(load_from)
 
-def save_dict_as_pkl(dic, save_dir, name=None):
+def save_dict_as_pkl(dic, save_dir, name=None, store=None):
     if name is not None:
         save_dir = os.path.join(save_dir, name+".pkl")
-    with open(save_dir, 'wb') as out:
-        pickle.dump(dic, out, protocol=pickle.HIGHEST_PROTOCOL)
+    storage.save_pickle(dic, save_dir)
+    deduplicate([save_dir], store)
 
 def load_dict_from_pkl(load_from, name=None):
     if name is not None:
         load_from = os.path.join(load_from, name+".pkl")
-    with open(load_from, "rb") as out:
-        dic = pickle.load(out)
-
-    return dic
-
+    return storage.load_pickle(load_from)
 
+def save_results(dic, save_dir, name="results", compress=False, store=None):
+    """
+    Save a dictionary that may contain (large) numpy arrays. Arrays are
+    stored in .npy files next to the json and memory mapped on load.
+    """
+    path = storage.save_dict(dic, os.path.join(save_dir, name+".json"), compress)
+    if store is not None:
+        arrays_dir = [os.path.join(save_dir, entry) for entry in os.listdir(save_dir)
+                      if entry.startswith(os.path.basename(path) + ".arrays-")]
+        deduplicate([path] + [os.path.join(d, f) for d in arrays_dir
+                              for f in os.listdir(d)], store, save_dir)
+    return path
+
+def save_file(src, save_dir, name=None, store=None):
+    """
+    Copy a file (dataset, expert demonstrations, pretrained weights) into
+    save_dir. With a blob_store.BlobStore the copy is a link to a single
+    stored copy shared by all runs.
+    """
+    if store is not None:
+        return store.add_file(src, save_dir, name)
+    dest = os.path.join(save_dir, os.path.basename(src) if name is None else name)
+    with storage.atomic_write(dest, 'wb') as f, open(src, 'rb') as s:
+        shutil.copyfileobj(s, f)
+    return dest
+
+def deduplicate(paths, store, run_dir=None):
+    """Move freshly saved files into store (if any) and link them back."""
+    if store is None:
+        return
+    for path in paths:
+        store.add(path, os.path.dirname(path) if run_dir is None else run_dir)
+
+def load_results(load_from, name="results", mmap=True):
+    return storage.load_dict(os.path.join(load_from, name+".json"), mmap)
@@ -1,23 +1,50 @@
 import os
+import sys
 import time
+import random
 import argparse
-import importlib
-import subprocess
-
-import numpy as np
-import wandb
 
 import utils
+import run_cache
+import config_loader
+
+# numpy and wandb are imported inside the functions that need them so that
+# --help and --validate_only return without paying for those imports.
 
 #==============================================================================
 # Main function that setups up argparse, wandb etc.
 #==============================================================================
 
-def main(raw_args=None):
-    start = time.time()
+def on_cambridge_hpc():
+    return os.path.basename(os.path.expanduser("~").rstrip('/')) == 'ua237'
+
+def get_root_dir():
+    """Directory that holds the runs of all projects."""
+    return '/rds-d7/user/ua237/hpc-work/wandb' if on_cambridge_hpc() else './wandb'
+
+def get_base_dir(config):
+    """Directory under which wandb will create the folder for this run."""
+    base_dir = get_root_dir()
+    base_dir = base_dir + '/' + config['project'] if config['project'] is not None else base_dir
+    base_dir = base_dir + '/' + config['group'] if config['group'] is not None else base_dir
+    return base_dir
+
+_parser = None
+
+def get_parser():
+    """
+    Return the argparse parser used by main(). It is built on the first call
+    and reused afterwards so that launching many runs in one process does not
+    rebuild it every time.
+    """
+    global _parser
+    if _parser is not None:
+        return _parser
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--config_file", "-cf", type=str, default=None,
-        help="You can pass a yaml config file to override argparse defaults.")
+        help="You can pass a yaml, json or python config file to override \
+              argparse defaults. A _base_ key in it names configs it extends.")
     parser.add_argument("--seed", "-s", type=int, default=None)
     # ========================== Wandb Setup ============================== #
     parser.add_argument("--entity", "-e", type=str, default="usman391",
@@ -28,6 +55,62 @@ def main(raw_args=None):
         help="Wandb Group")
     parser.add_argument("--name", "-n", type=str, default=None,
         help="Wandb experiment name.")
+    parser.add_argument("--skip_completed", "-sc", action="store_true",
+        help="Return the save_dir of an earlier completed run with the same \
+              config instead of starting a new run.")
+    parser.add_argument("--cache_ignore_keys", "-cik", type=str, nargs='*', default=[],
+        help="Keys left out of the config hash, e.g. seed.")
+    parser.add_argument("--log_window", "-lw", type=int, default=100,
+        help="Number of steps aggregated into a single wandb.log call.")
+    parser.add_argument("--log_interval", "-li", type=float, default=10.,
+        help="Seconds between flushes of the background metric logger.")
+    parser.add_argument("--scratch_dir", "-sd", type=str, default=None,
+        help="Write the run to this fast local directory (e.g. '$TMPDIR') and \
+              copy it to base_dir in the background. What crashed jobs left \
+              unsynced there is copied at startup.")
+    parser.add_argument("--sync_interval", "-syi", type=float, default=30.,
+        help="Seconds between copies from scratch_dir to base_dir.")
+    parser.add_argument("--resume", "-r", action="store_true",
+        help="Continue the unfinished run with the same config (same seed and \
+              run id) and checkpoint on SIGTERM/SIGUSR1.")
+    parser.add_argument("--async_init", "-ai", action="store_true",
+        help="Run wandb.init in the background while training is set up. \
+              save_dir is then chosen locally as base_dir/runs/<name>_<id>.")
+    parser.add_argument("--monitor_interval", "-mi", type=float, default=None,
+        help="Sample cpu, memory and I/O of the run from /proc every this many \
+              seconds (e.g. 0.1) instead of using wandb's system monitor.")
+    parser.add_argument("--monitor_summary_interval", "-msi", type=float, default=30.,
+        help="Seconds between the percentile summaries the monitor logs.")
+    parser.add_argument("--asha_min_resource", "-amr", type=lambda x: int(float(x)),
+        default=None, help="Stop runs of a sweep that are not in the top \
+              1/asha_reduction_factor at timesteps amr, amr*arf, ... (ASHA).")
+    parser.add_argument("--asha_reduction_factor", "-arf", type=float, default=3.)
+    parser.add_argument("--asha_mode", "-amo", type=str, default="max",
+        choices=["max", "min"], help="Whether the reported metric is maximized.")
+    parser.add_argument("--asha_experiment", "-aex", type=str, default=None,
+        help="Runs are only compared with runs of the same experiment. Defaults \
+              to one per --sweep_file content, 'default' for single runs.")
+    parser.add_argument("--log_timings", "-lt", action="store_true",
+        help="Add the time spent in every setup phase to the run summary.")
+    parser.add_argument("--profile_setup", "-ps", action="store_true",
+        help="Write a cProfile and tracemalloc report of the setup to save_dir.")
+    # ========================== Sweeps ================================== #
+    parser.add_argument("--sweep_file", "-sf", type=str, default=None,
+        help="Run this task's share of a sweep spec instead of a single run. \
+              The other arguments are passed to every run of the sweep.")
+    parser.add_argument("--shard_index", "-si", type=int, default=None,
+        help="Index of this task. Read from SLURM/SGE array variables if unset.")
+    parser.add_argument("--num_shards", "-ns", type=int, default=None,
+        help="Number of tasks the sweep is split across.")
+    parser.add_argument("--shard_cost_key", "-sck", type=str, default=None,
+        help="Balance shards by the value of this key, e.g. timesteps.")
+    parser.add_argument("--num_workers", "-nw", type=int, default=1,
+        help="Number of processes used to run the configs of a shard.")
+    parser.add_argument("--cores_per_run", "-cpr", type=int, default=None,
+        help="Pin every process of a shard to this many cores of its own and \
+              limit its BLAS/OpenMP threads to match.")
+    parser.add_argument("--validate_only", "-vo", action="store_true",
+        help="Resolve and print the config, then exit without starting a run.")
     # ======================= Add your own args =========================== #
     parser.add_argument("--false_by_default_arg", "-fda", action="store_true",
         help="Use store_true for args that are false by default.")
@@ -46,65 +129,319 @@ def main(raw_args=None):
     parser.add_argument("--mlp_layers", "-pl", type=int, default=[64,64], nargs='*',
         help="Use nargs for list args.")
 
- 
+    _parser = parser
+    return _parser
+
+SWEEP_KEYS = utils.SWEEP_KEYS
+
+def sweep_experiment(sweep_file):
+    """ASHA experiment of the runs of a sweep: its file name and content hash."""
+    import hashlib
+    with open(sweep_file, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return "%s-%s" % (os.path.splitext(os.path.basename(sweep_file))[0], digest)
+
+def run_sweep(args, raw_args):
+    """
+    Run the configs of args["sweep_file"] that belong to this shard and
+    return their save_dirs. Every task of a job array computes its own share
+    from the sweep alone, so no coordinator is needed.
+    """
+    import launcher
+    import sharding
+
+    shard_index, num_shards = args["shard_index"], args["num_shards"]
+    if (shard_index is None) != (num_shards is None):
+        raise ValueError("--shard_index and --num_shards must be given together")
+    if shard_index is None:
+        shard_index, num_shards = sharding.shard_from_env() or (0, 1)
+    base_args = sharding.strip_options(raw_args, SWEEP_KEYS, get_parser())
+    if args["asha_experiment"] is None:
+        # Every shard (and relaunch) of this sweep shares the ASHA rungs, an
+        # edited or unrelated sweep gets its own.
+        base_args += ["--asha_experiment", sweep_experiment(args["sweep_file"])]
+    sweep = launcher.load_sweep_file(args["sweep_file"])
+    return sharding.run_shard(sweep, shard_index, num_shards, base_args,
+                              args["shard_cost_key"], args["num_workers"],
+                              args["cores_per_run"])
+
+def main(raw_args=None, return_timings=False):
+    """
+    Set up a run from raw_args (sys.argv if None) and return its save_dir.
+    With return_timings=True a (save_dir, timings) tuple is returned instead,
+    where timings holds the time spent in every phase of the setup. With
+    --sweep_file the list of save_dirs of this shard's runs is returned.
+    """
+    start = time.time()
+    timer = utils.PhaseTimer()
+    parser = get_parser()
+    # Use the same argument vector for parsing and for deciding which
+    # arguments were given explicitly.
+    raw_args = sys.argv[1:] if raw_args is None else raw_args
     args = vars(parser.parse_args(raw_args))
+    if args["sweep_file"] is not None:
+        return run_sweep(args, raw_args)
+    profiler = utils.SetupProfiler() if args["profile_setup"] else None
+    timer.lap("parse_args")
 
     # Get default config
     default_config, mod_name = {}, ''
     if args["config_file"] is not None:
+        default_config = config_loader.load_config(args["config_file"])
         if args["config_file"].endswith(".py"):
-            mod_name = args["config_file"].replace('/', '.').strip(".py")
-            default_config = importlib.import_module(mod_name).config
-        elif args["config_file"].endswith(".json"):
-            default_config = utils.load_dict_from_json(args["config_file"])
-        else:
-            raise ValueError("Invalid type of config file")
+            mod_name = config_loader.module_name(args["config_file"])
+    timer.lap("load_config")
 
     # Overwrite config file with parameters supplied through parser
     # Order of priority: supplied through command line > specified in config
     # file > default values in parser
-    raw_args = [] if raw_args is None else raw_args
     config = utils.merge_configs(default_config, parser, args, raw_args)
-    # Choose seed
+    # Hash the config before the seed and name are filled in so that
+    # relaunching the same arguments gives the same hash.
+    config["config_hash"] = run_cache.config_hash(config, config["cache_ignore_keys"])
+    timer.lap("merge_configs")
+    # Choose seed. When resuming, reuse the seed of the run being resumed
+    # unless one was given explicitly.
+    resumed = None
+    if config["resume"]:
+        resumed = run_cache.RunCache(get_base_dir(config)).lookup(config["config_hash"])
+        if resumed is not None and resumed.get("seed") is not None and config["seed"] is None:
+            config["seed"] = resumed["seed"]
     if config["seed"] is None:
-        config["seed"] = np.random.randint(0,100)
+        config["seed"] = random.randint(0,99)
 
     # Get name by concatenating arguments with non-default values. Default
     # values are either the one specified in config file or in parser (if both
     # are present then the one in config file is prioritized)
     config["name"] = utils.get_name(parser, default_config, config, mod_name)
+    timer.lap("naming")
 
-    # Initialize W&B project
-    on_cambridge_hpc = (subprocess.check_output(["echo $HOME"],
-                        shell=True).decode('utf-8').strip().split("/")[-1] == 'ua237')
-    base_dir = '/rds-d7/user/ua237/hpc-work/wandb' if on_cambridge_hpc else './wandb'
-    base_dir = base_dir + '/' + config['project'] if config['project'] is not None else base_dir
-    base_dir = base_dir + '/' + config['group'] if config['group'] is not None else base_dir
+    def done(save_dir):
+        # Early return: the profiler must not keep running in the process
+        # (e.g. a launcher worker) after main() is done.
+        if profiler is not None:
+            profiler.stop()
+        return (save_dir, timer.report()) if return_timings else save_dir
+
+    if config["validate_only"]:
+        for key, value in sorted(config.items()):
+            print("%s: %s" % (key, value))
+        return done(None)
+
+    # Cores and thread limits this run got (e.g. from the launcher).
+    import placement
+    config["placement"] = placement.describe()
+
+    base_dir = get_base_dir(config)
     os.makedirs(base_dir, exist_ok=True)
-    run = wandb.init(entity=config["entity"], 
-                     project=config["project"], 
-                     name=config["name"], config=config, dir=base_dir,
-                     group=config['group'], reinit=True, monitor_gym=True)
-    wandb.config.save_dir = wandb.run.dir
-    config = wandb.config
-
-    print(utils.colorize("Configured folder %s for saving" % config.save_dir,
-          color="green", bold=True))
-    print(utils.colorize("Name: %s" % config.name, color="green", bold=True))
+    timer.lap("makedirs")
+    cache = run_cache.RunCache(base_dir)
+    if config["skip_completed"] or config["resume"]:
+        save_dir = cache.completed(config["config_hash"])
+        timer.lap("cache_lookup")
+        if save_dir is not None:
+            print(utils.colorize("Config already completed in %s, skipping" % save_dir,
+                  color="yellow", bold=True))
+            return done(save_dir)
+
+    # With a scratch dir wandb (and the training code) write to local disk and
+    # files are copied to base_dir in the background. durable() maps paths on
+    # scratch to where they end up.
+    scratch_dir = config["scratch_dir"]
+    run_base_dir = base_dir
+    if scratch_dir is not None:
+        import scratch_sync
+        run_base_dir = scratch_sync.scratch_path(scratch_dir, base_dir)
+        os.makedirs(run_base_dir, exist_ok=True)
+        # Copy what earlier jobs on this node left unsynced when they crashed.
+        scratch_sync.recover(scratch_dir, base_dir)
+        timer.lap("scratch_recover")
+    def durable(path):
+        if scratch_dir is None:
+            return path
+        return scratch_sync.durable_path(scratch_dir, base_dir, path)
+
+    # Initialize W&B project
+    init_kwargs = dict(entity=config["entity"], 
+                       project=config["project"], 
+                       name=config["name"], config=config, dir=run_base_dir,
+                       group=config['group'], reinit=True, monitor_gym=True)
+    if config["monitor_interval"] is not None:
+        init_kwargs["settings"] = {"x_disable_stats": True}
+    run_id = resumed.get("run_id") if resumed is not None else None
+    if run_id is not None:
+        print(utils.colorize("Resuming run %s" % run_id, color="yellow", bold=True))
+        init_kwargs.update(id=run_id, resume="allow")
+
+    # With --async_init on_ready runs in the init thread, so it times its
+    # phases on its own timer; they are merged in once the run is ready.
+    ready_phases = {}
+    def on_ready(run):
+        """Everything that needs the initialized run."""
+        ready_timer = utils.PhaseTimer() if config["async_init"] else timer
+        run_config = run.config
+        # wandb does not create run.dir when it is disabled.
+        os.makedirs(run_config.save_dir, exist_ok=True)
+
+        print(utils.colorize("Configured folder %s for saving" % run_config.save_dir,
+              color="green", bold=True))
+        print(utils.colorize("Name: %s" % run_config.name, color="green", bold=True))
+        cache.update(run_config.config_hash, save_dir=durable(run_config.save_dir),
+                     name=run_config.name, status="running",
+                     seed=run_config.seed, run_id=run.id)
+        from run_index import RunIndex
+        index = RunIndex(get_root_dir())
+        index.start(durable(run_config.save_dir), run_config.as_dict(), start_time=start)
+        index.close()
+        ready_timer.lap("run_index")
+
+        # Save config
+        utils.save_dict_as_json(run_config.as_dict(), run_config.save_dir, "config")
+        ready_timer.lap("save_config")
+        if ready_timer is not timer:
+            ready_phases.update(ready_timer.phases)
+
+    if config["async_init"]:
+        # Decide the save dir locally so that nothing has to wait for wandb.
+        # The handshake then overlaps with whatever is set up below; run is a
+        # handle that waits for the real run when it is first needed.
+        from async_run import AsyncRun
+        if run_id is None:
+            run_id = AsyncRun.new_id()
+        config["save_dir"] = os.path.join(run_base_dir, "runs",
+                                          "%s_%s" % (config["name"], run_id))
+        os.makedirs(config["save_dir"], exist_ok=True)
+        init_kwargs.update(id=run_id, dir=config["save_dir"])
+        run = AsyncRun(init_kwargs, on_ready)
+        config = utils.ConfigDict(config)
+        timer.lap("wandb_init_start")
+    else:
+        import wandb
+        timer.lap("import_wandb")
+        run = wandb.init(**init_kwargs)
+        wandb.config.save_dir = wandb.run.dir
+        config = wandb.config
+        timer.lap("wandb_init")
+        on_ready(run)
+
+    # Read-only snapshot of the config as sent to the run. Attribute access
+    # on it is a plain slot lookup, so use it in hot loops instead of config.
+    hparams = utils.freeze_config(config)
+
+    # Use logger.log(metrics, step) instead of wandb.log in the training loop.
+    # Metrics are aggregated and sent from a background thread; run.finish()
+    # sends whatever is still buffered. The aggregates are also written to
+    # save_dir/metrics, which metrics_log.load_metrics reads back offline.
+    from logger import BatchedLogger
+    from metrics_log import MetricsLog
+    logger = BatchedLogger(run, window=config.log_window,
+                           flush_interval=config.log_interval,
+                           metrics_log=MetricsLog(os.path.join(config.save_dir, "metrics")))
+    timer.lap("logger")
+
+    if config.monitor_interval is not None:
+        from sys_monitor import SystemMonitor
+        SystemMonitor(run, config.monitor_interval,
+                      config.monitor_summary_interval).attach(run, config.save_dir)
+        timer.lap("monitor")
+
+    # Large files that many runs save identically (datasets, expert
+    # demonstrations, pretrained weights) are stored once and linked into
+    # save_dir when saved with store=store, e.g.
+    #   utils.save_file(config.expert_path, config.save_dir, store=store)
+    from blob_store import BlobStore
+    store = BlobStore(os.path.join(get_root_dir(), "blobs"))
+
+    if scratch_dir is not None:
+        # Sync the whole wandb run directory, not just the files folder.
+        # Attached before the signal handlers below so that a preempted run
+        # is synced too. Links to blobs stay links in base_dir.
+        sync_root = config.save_dir if config.async_init else os.path.dirname(config.save_dir)
+        scratch_sync.ScratchSyncer(sync_root, durable(sync_root), config.sync_interval,
+                                   link_roots=[store.root]).attach(run)
+        timer.lap("scratch_sync")
+
+    # Checkpoints go to base_dir (not scratch) under the config hash and seed
+    # so that a requeued job finds them. With --resume, SIGTERM/SIGUSR1 run the
+    # registered callbacks (e.g. a final save) before the process exits.
+    from resume import Checkpointer
+    checkpointer = Checkpointer(os.path.join(base_dir, "checkpoints",
+                                             "%s_s%d" % (config.config_hash, config.seed)))
+    if config.resume:
+        # Callbacks run last to first: finishing the run flushes the logger
+        # and, with a scratch dir, does the final sync to base_dir. The run is
+        # only marked preempted afterwards since with --async_init on_ready
+        # may still mark it running while the run finishes.
+        checkpointer.on_preempt(lambda: cache.update(config.config_hash, status="preempted",
+                                                     unless_status=("completed", "stopped")))
+        checkpointer.on_preempt(run.finish)
+        # The handlers only cover this run: finishing it puts back the old ones.
+        checkpointer.install_signal_handlers()
+        checkpointer.attach(run)
+
+    # Early stopping across the runs of an experiment in base_dir (see
+    # asha.ASHA). Every run is its own trial, so repeats of a config (and a
+    # rerun after a failure) are judged on their own results; a resumed run
+    # keeps its run id and continues as the same trial.
+    scheduler = None
+    trial = run_id if config.async_init else run.id
+    if config.asha_min_resource is not None:
+        from asha import ASHA
+        scheduler = ASHA(os.path.join(base_dir, "asha.sqlite"),
+                         config.asha_min_resource, config.timesteps,
+                         config.asha_reduction_factor, config.asha_mode,
+                         experiment=config.asha_experiment or "default")
+
+    def save_timings(run, timings):
+        # Save how long each phase of the setup took next to config.json
+        utils.save_dict_as_json(timings, config.save_dir, "timing")
+        if config.log_timings:
+            run.summary.update({"setup_time/" + k: v for k, v in timings["phases"].items()})
 
-    # Save config
-    utils.save_dict_as_json(config.as_dict(), config.save_dir, "config")
+    # Setup ends here: stop the profiler before training starts.
+    timings = timer.report()
+    if profiler is not None:
+        timings["peak_memory_mb"] = profiler.stop(config.save_dir)/2**20
+    if config.async_init:
+        # Complete once the run is ready, see below.
+        utils.save_dict_as_json(timings, config.save_dir, "timing")
+    else:
+        save_timings(run, timings)
 
     #==============================================================================
     # TODO: ADD CALLS TO TRAIN ETC. HERE
+    # Inside loops read hyperparameters from hparams, e.g. hparams.float_arg.
+    # To make training resumable:
+    #   latest = checkpointer.load_latest()    # (step, state) or None
+    #   checkpointer.on_preempt(lambda: checkpointer.save(state, step))
+    # With --asha_min_resource, report regularly and stop when told to:
+    #   if scheduler.report(trial, step, reward) == "stop": break
     #==============================================================================
 
     end = time.time()
     print(utils.colorize("Time taken: %05.2f minutes" % ((end-start)/60),
           color="green", bold=True))
 
+    if config.async_init:
+        run.result()
+        timings["phases"]["wandb_init"] = run.init_seconds
+        timings["phases"].update(ready_phases)
+        save_timings(run, timings)
+    status = "completed"
+    if scheduler is not None:
+        if scheduler.stopped(trial):
+            status = "stopped"
+        scheduler.close()
     run.finish()
-    return config.save_dir
+    # Only now are the run files final (and synced from scratch), so bulk_sync
+    # and --skip_completed/--resume can rely on the status.
+    cache.update(config.config_hash, status=status)
+    from run_index import RunIndex
+    index = RunIndex(get_root_dir())
+    index.finish(durable(config.save_dir), status)
+    index.close()
+    save_dir = durable(config.save_dir)
+    return (save_dir, timings) if return_timings else save_dir
 
 if __name__ == '__main__':
     main()
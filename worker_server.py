@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import importlib
+import traceback
+
+import utils
+
+#==============================================================================
+# Fork server that keeps wandb, numpy and the training code imported and
+# starts every run in a forked child, so a launch costs a fork instead of a
+# fresh interpreter.
+#==============================================================================
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(),
+                              "wandb-starter-%d.sock" % os.getuid())
+# Seconds a client has to send its request. The server reads requests one
+# at a time, so a client that connects and sends nothing must not hold it up.
+REQUEST_TIMEOUT = 1.
+
+def preload(modules=[]):
+    """Import everything a run needs once, before any child is forked."""
+    import numpy
+    import wandb
+    import wandb_setup
+    wandb_setup.get_parser()
+    for name in modules:
+        importlib.import_module(name)
+    return wandb_setup
+
+def send(conn, message):
+    conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+def run_child(conn, wandb_setup, request):
+    """Body of a forked child: run main and report back. Never returns."""
+    status = 1
+    try:
+        # The child inherits the random state of the server.
+        import launcher
+        launcher.reseed()
+        if request.get("cwd") is not None:
+            os.chdir(request["cwd"])
+        send(conn, {"status": "started", "pid": os.getpid(), "time": time.time()})
+        save_dir = wandb_setup.main(request["raw_args"])
+        send(conn, {"status": "finished", "save_dir": save_dir})
+        status = 0
+    except BaseException as e:
+        try:
+            send(conn, {"status": "failed", "error": repr(e),
+                        "traceback": traceback.format_exc()})
+        except OSError:
+            pass
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def reap(children, block=False):
+    while len(children) > 0:
+        try:
+            pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            children.clear()
+            return
+        if pid == 0:
+            return
+        children.discard(pid)
+        block = False
+
+def serve(socket_path=DEFAULT_SOCKET, modules=[], max_children=None):
+    """
+    Listen on a unix socket for requests, one json line per connection:
+
+        {"raw_args": ["-ia", "3"], "cwd": "/path/to/run/from"}
+        {"cmd": "ping"}
+        {"cmd": "shutdown"}
+
+    Every run request is answered with json lines as the forked child goes
+    through "started" (with its pid) and "finished" (with the save_dir) or
+    "failed" (with the traceback).
+    """
+    wandb_setup = preload(modules)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Whoever can connect can run code as this user (e.g. through a python
+    # --config_file), so only the owner may. The umask covers the window
+    # between bind and chmod.
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+    server.listen(128)
+    server.settimeout(1.0)
+    print(utils.colorize("Worker server listening on %s" % socket_path,
+          color="green", bold=True))
+
+    children = set()
+    try:
+        while True:
+            reap(children)
+            if max_children is not None and len(children) >= max_children:
+                reap(children, block=True)
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(REQUEST_TIMEOUT)
+            with conn:
+                # A bad request (empty, not json, not an object, too slow)
+                # must not take the server down.
+                try:
+                    message = json.loads(conn.makefile('rb').readline())
+                    if not isinstance(message, dict):
+                        raise ValueError("request is not a json object")
+                except (ValueError, socket.timeout) as e:
+                    try:
+                        send(conn, {"status": "failed", "error": repr(e)})
+                    except OSError:
+                        pass
+                    continue
+                conn.settimeout(None)
+                if message.get("cmd") == "ping":
+                    send(conn, {"status": "ok", "pid": os.getpid(),
+                                "children": len(children)})
+                    continue
+                if message.get("cmd") == "shutdown":
+                    send(conn, {"status": "ok"})
+                    break
+                pid = os.fork()
+                if pid == 0:
+                    server.close()
+                    run_child(conn, wandb_setup, message)
+                children.add(pid)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        reap(children, block=True)
+
+def request(message, socket_path=DEFAULT_SOCKET):
+    """Send message to the server and yield its replies as they arrive."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        send(conn, message)
+        for line in conn.makefile('rb'):
+            yield json.loads(line)
+
+def submit(raw_args, socket_path=DEFAULT_SOCKET, cwd=None):
+    """Start a run on the server and yield its status messages."""
+    cwd = os.getcwd() if cwd is None else cwd
+    return request({"raw_args": list(raw_args), "cwd": cwd}, socket_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--socket", "-so", type=str, default=DEFAULT_SOCKET)
+    parser.add_argument("--preload", "-pr", type=str, nargs='*', default=[],
+        help="Modules (e.g. your training code) to import before forking.")
+    parser.add_argument("--max_children", "-mc", type=int, default=None,
+        help="Maximum number of runs executing at the same time.")
+    parser.add_argument("--submit", action="store_true",
+        help="Send the remaining arguments (after --) as a run to a running server.")
+    parser.add_argument("--shutdown", action="store_true")
+    args, run_args = parser.parse_known_args()
+    if len(run_args) > 0 and run_args[0] == '--':
+        run_args = run_args[1:]
+
+    if args.shutdown:
+        print(next(request({"cmd": "shutdown"}, args.socket)))
+    elif args.submit:
+        for message in submit(run_args, args.socket):
+            print(json.dumps(message))
+    else:
+        serve(args.socket, args.preload, args.max_children)